@@ -1,24 +1,33 @@
 # Four-In-A-Row, by Al Sweigart al@inventwithpython.com
 # (Pygame) Play against the computer, dropping tiles to connect four.
 
-import random, copy, sys, pygame
+import random, sys, os, math, time, mmap, struct, concurrent.futures, pygame
 from pygame.locals import *
 
 BOARDWIDTH = 7   # how many spaces wide the board is
-BOARDHEIGHT = 6  # how many spaces tall the board is
-assert BOARDWIDTH >= 4 and BOARDHEIGHT >= 4, 'Board must be at least 4x4.'
+BOARDHEIGHT = 6  # how many spaces tall the board is (setBoardSize() changes both)
 
-DIFFICULTY = 2   # how many moves to look ahead. (>2 is usually too much)
+DIFFICULTY = BOARDWIDTH * BOARDHEIGHT # deepest the computer may look ahead, in moves
+THINKINGTIME = 1000 # milliseconds the computer may spend choosing a move
+TABLEMEGABYTES = 32 # memory the computer may use to remember searched positions
+WORKERS = 1 # processes the computer searches with (more than 1 splits up the columns)
+ENGINE = 'alphabeta' # how the computer picks moves: ALPHABETA or MCTS
+MCTSEXPLORATION = 1.4 # how much Monte Carlo tree search favors rarely tried moves
+USEOPENINGBOOK = True # play the first moves from OPENINGBOOKFILE if it exists
+OPENINGBOOKFILE = '4row_book.bin' # made by fourinarowbook.py
+USESOLVEDDATABASE = True # play perfectly from SOLVEDDATABASEFILE if it exists for the board size
+SOLVEDDATABASEFILE = '4row_solved_%sx%s.bin' # made by fourinarowsolver.py, for the width and height
 
 SPACESIZE = 50   # size of the tokens and board spaces in pixels
 
 FPS = 30         # frames per second to update the screen
+LAYEREDRENDERING = True # draw from cached layers and only update the parts of the window that change
+BACKGROUNDTHINKING = True # search for the computer's move in another process while its token moves
+PONDERING = True # search answers to the player's possible moves while they choose one
+HOVERSPEED = 4   # pixels per frame the computer's token drifts while it is still thinking
 WINDOWWIDTH = 640
 WINDOWHEIGHT = 480
 
-XMARGIN = int((WINDOWWIDTH - BOARDWIDTH * SPACESIZE) / 2)
-YMARGIN = int((WINDOWHEIGHT - BOARDHEIGHT * SPACESIZE) / 2)
-
 BRIGHTBLUE = (0, 50, 255)
 WHITE      = (255, 255, 255)
 
@@ -30,14 +39,139 @@ BLACK  = 'black'
 EMPTY  = None
 HUMAN  = 'human'
 COMPUTER = 'computer'
+DRAW   = 'draw'
+
+ALPHABETA = 'alphabeta' # iterative-deepening alpha-beta search
+MCTS      = 'mcts'      # Monte Carlo tree search with random playouts
 
 # Current turn indicator
 CURRENTTURN = None
 
+# The board keeps a count for every winning line: 1 for each red token in
+# it plus 5 for each black one, so a count tells exactly what the line holds
+# (4 is four red, 20 four black). LINESCORES gives red's side of the
+# evaluation for every count; lines holding both colors can never be won
+# and score 0.
+THREEWEIGHT = 50 # score of a line with three of a player's tokens and an empty space
+TWOWEIGHT = 5    # score of a line with two of a player's tokens and two empty spaces
+LINECODES = {RED: 1, BLACK: 5}
+LINESCORES = [0] * 26
+LINESCORES[2], LINESCORES[3] = TWOWEIGHT, THREEWEIGHT
+LINESCORES[10], LINESCORES[15] = -TWOWEIGHT, -THREEWEIGHT
+# How much a line's score changes when player adds a token to it, by the
+# line's count before the token.
+LINESCORECHANGES = dict((player, [LINESCORES[min(25, count + code)] - LINESCORES[count] for count in range(21)])
+                        for player, code in LINECODES.items())
+
+WINSCORE = 1000000 # score of a won position, less the moves it took to win
+
+# Transposition table settings. Each entry is a tuple of the board hash, the
+# depth it was searched to, whether the score is exact or a bound, the score,
+# the best move and the age (number of the search that stored it).
+EXACT = 'exact'
+LOWERBOUND = 'lower'
+UPPERBOUND = 'upper'
+DEPTHPREFERRED = 'depth-preferred' # keep whichever entry was searched deeper
+TWOTIER = 'two-tier' # one depth-preferred slot plus one always-replace slot
+TABLEENTRYBYTES = 160 # size of one entry tuple and its list slot (sys.getsizeof)
+
+# Opening books (and other position databases) are files made of a header
+# and then one fixed-size record per position, sorted by key. A record is
+# the position key in big-endian bytes followed by a one-byte value, so the
+# file can be searched in place through mmap without being parsed.
+POSITIONFILEMAGIC = b'4ROW'
+POSITIONFILEHEADER = struct.Struct('<4sBBBBI') # magic, width, height, key bytes, plies, records
+
+def setBoardSize(width, height):
+    # Sets BOARDWIDTH and BOARDHEIGHT and rebuilds every table that depends
+    # on them. Runs once when the module loads; call it again (before making
+    # any boards) to play or solve on another size.
+    global BOARDWIDTH, BOARDHEIGHT, XMARGIN, YMARGIN, COLUMNBITS, WINSHIFTS, WINNINGLINES, CELLLINES
+    global MOVEORDER, MOVEORDERFROM, ZOBRISTKEYS, SIDEKEYS, KEYBYTES, COLUMNMASK
+    global transpositionTable, mctsTree, openingBook, solvedDatabase
+    assert width >= 4 and height >= 4, 'Board must be at least 4x4.'
+    BOARDWIDTH = width
+    BOARDHEIGHT = height
+    XMARGIN = int((WINDOWWIDTH - BOARDWIDTH * SPACESIZE) / 2)
+    YMARGIN = int((WINDOWHEIGHT - BOARDHEIGHT * SPACESIZE) / 2)
+
+    # The board is stored as bitboards. Bit (x * COLUMNBITS + row) stands for
+    # column x, with rows counted up from the bottom of the board. Every column
+    # gets one spare bit on top so that shifting a bitboard never carries a line
+    # of tokens over into the next column.
+    COLUMNBITS = BOARDHEIGHT + 1
+    WINSHIFTS = (1, COLUMNBITS, COLUMNBITS - 1, COLUMNBITS + 1) # vertical, horizontal, diag \, diag /
+
+    # Every line of four spaces a player can win with, as tuples of (x, y)
+    # spaces (y = 0 is the top row), and for every bit of the bitboard the
+    # indexes into WINNINGLINES of the lines that pass through that space.
+    WINNINGLINES = []
+    for x in range(BOARDWIDTH):
+        for y in range(BOARDHEIGHT):
+            for dx, dy in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                line = tuple((x + i * dx, y + i * dy) for i in range(4))
+                if all(0 <= lx < BOARDWIDTH and 0 <= ly < BOARDHEIGHT for lx, ly in line):
+                    WINNINGLINES.append(line)
+    CELLLINES = [[] for i in range(BOARDWIDTH * COLUMNBITS)]
+    for i, line in enumerate(WINNINGLINES):
+        for lx, ly in line:
+            CELLLINES[lx * COLUMNBITS + BOARDHEIGHT - 1 - ly].append(i)
+
+    # Columns in the order the search tries them. Moves near the center take
+    # part in more lines, so trying them first lets alpha-beta prune sooner.
+    # MOVEORDERFROM holds the orders to use when the transposition table
+    # suggests trying a given column first.
+    MOVEORDER = tuple(sorted(range(BOARDWIDTH), key=lambda x: abs(2 * x - BOARDWIDTH + 1)))
+    MOVEORDERFROM = [(column,) + tuple(x for x in MOVEORDER if x != column) for column in range(BOARDWIDTH)]
+
+    # Every space gets a random number per color, and a board's hash is the XOR
+    # of the numbers of all its tokens, so makeMove() can update it with one XOR.
+    # The numbers come from a fixed seed so every process agrees on them.
+    zobristRandom = random.Random(4)
+    ZOBRISTKEYS = {RED: [zobristRandom.getrandbits(64) for i in range(BOARDWIDTH * COLUMNBITS)],
+                   BLACK: [zobristRandom.getrandbits(64) for i in range(BOARDWIDTH * COLUMNBITS)]}
+    # Either player may start a game, so the same tokens can come up with
+    # either of them to move. The search XORs the number of the player to
+    # move into the table keys (see negamax()) to keep the two apart.
+    SIDEKEYS = {RED: 0, BLACK: zobristRandom.getrandbits(64)}
+
+    KEYBYTES = (BOARDWIDTH * COLUMNBITS + 7) // 8 # bytes of a position key in position files
+    COLUMNMASK = (1 << COLUMNBITS) - 1
+
+    # Anything remembered about boards of the old size is no use now.
+    transpositionTable = None
+    mctsTree = None
+    openingBook = None
+    solvedDatabase = None
+
+setBoardSize(BOARDWIDTH, BOARDHEIGHT)
+
+# Filled in by getComputerMove() about the last search it ran. 'source' is
+# 'database' if the move came from the solved database, 'book' if it came
+# from the opening book and 'search' otherwise. A Monte Carlo search counts
+# its playouts as 'nodes' and also sets 'playoutsPerSecond'.
+searchStats = {'nodes': 0, 'depth': 0, 'score': 0, 'time': 0.0, 'source': None, 'playoutsPerSecond': 0.0}
+
+# Filled in by drawBoard(): frames drawn, blits done and seconds spent.
+renderStats = {'frames': 0, 'blits': 0, 'time': 0.0}
+
+# The cached layers drawBoard() composes frames from, and what they show.
+boardLayerKey = None
+lastTokenRect = None
+
 def main():
+    initGraphics()
+
+    isFirstGame = True
+    while True:
+        runGame(isFirstGame)
+        isFirstGame = False
+
+def initGraphics():
     global FPSCLOCK, DISPLAYSURF, REDPILERECT, BLACKPILERECT
     global REDTOKENIMG, BLACKTOKENIMG, BOARDIMG, ARROWIMG, ARROWRECT
     global HUMANWINNERIMG, COMPUTERWINNERIMG, TIEWINNERIMG, WINNERRECT, BASICFONT
+    global BOARDOVERLAY, BOARDRECT, TOKENLAYER, FRAMELAYER
 
     pygame.init()
     FPSCLOCK = pygame.time.Clock()
@@ -67,10 +201,18 @@ def main():
 
     BASICFONT = pygame.font.Font('freesansbold.ttf', 16)
 
-    isFirstGame = True
-    while True:
-        runGame(isFirstGame)
-        isFirstGame = False
+    # The board overlay never changes, so its spaces are put together once.
+    BOARDRECT = pygame.Rect(XMARGIN, YMARGIN, BOARDWIDTH * SPACESIZE, BOARDHEIGHT * SPACESIZE)
+    BOARDOVERLAY = pygame.Surface(BOARDRECT.size, SRCALPHA)
+    for x in range(BOARDWIDTH):
+        for y in range(BOARDHEIGHT):
+            BOARDOVERLAY.blit(BOARDIMG, (x * SPACESIZE, y * SPACESIZE))
+
+    # TOKENLAYER is the background, turn text and tokens, FRAMELAYER is that
+    # with the board overlay and token piles on top: a whole frame without a
+    # moving token. drawBoard() redraws them when the board changes.
+    TOKENLAYER = pygame.Surface((WINDOWWIDTH, WINDOWHEIGHT)).convert()
+    FRAMELAYER = pygame.Surface((WINDOWWIDTH, WINDOWHEIGHT)).convert()
 
 def runGame(isFirstGame):
     global CURRENTTURN
@@ -86,23 +228,32 @@ def runGame(isFirstGame):
         showHelp = False
 
     mainBoard = getNewBoard()
+    ponderStats.update(hits=0, misses=0, saved=0.0)
 
     while True:  # main game loop
         CURRENTTURN = turn
 
         if turn == HUMAN:
+            if PONDERING:
+                startPondering(mainBoard)
             getHumanMove(mainBoard, showHelp)
             if showHelp:
                 showHelp = False
-            if isWinner(mainBoard, RED):
+            if isLastMoveWinner(mainBoard):
                 winnerImg = HUMANWINNERIMG
                 break
             turn = COMPUTER
         else:
-            column = getComputerMove(mainBoard)
-            animateComputerMoving(mainBoard, column)
+            column = None
+            if ponderCache:
+                column = getPonderedMove(mainBoard)
+            if column is None and BACKGROUNDTHINKING:
+                column = getBackgroundPool().submit(getComputerMove, mainBoard)
+            elif column is None:
+                column = getComputerMove(mainBoard)
+            column = animateComputerMoving(mainBoard, column)
             makeMove(mainBoard, BLACK, column)
-            if isWinner(mainBoard, BLACK):
+            if isLastMoveWinner(mainBoard):
                 winnerImg = COMPUTERWINNERIMG
                 break
             turn = HUMAN
@@ -111,25 +262,150 @@ def runGame(isFirstGame):
             winnerImg = TIEWINNERIMG
             break
 
+    if PONDERING:
+        stopPondering()
+        asked = ponderStats['hits'] + ponderStats['misses']
+        if asked:
+            print('Pondering: %s of %s answers ready in advance (%.0f%%), %.1f seconds of thinking saved'
+                  % (ponderStats['hits'], asked, 100 * ponderStats['hits'] / asked, ponderStats['saved']))
+
     while True:
-        drawBoard(mainBoard)
+        dirtyRects = drawBoard(mainBoard)
         DISPLAYSURF.blit(winnerImg, WINNERRECT)
-        pygame.display.update()
+        pygame.display.update(dirtyRects + [WINNERRECT])
         FPSCLOCK.tick()
         for event in pygame.event.get():
             if event.type == QUIT or (event.type == KEYUP and event.key == K_ESCAPE):
-                pygame.quit()
-                sys.exit()
+                terminate()
             elif event.type == MOUSEBUTTONUP:
                 return
 
 def makeMove(board, player, column):
-    lowest = getLowestEmptySpace(board, column)
-    if lowest != -1:
-        board[column][lowest] = player
+    if isValidMove(board, column):
+        row = board['heights'][column]
+        index = column * COLUMNBITS + row
+        board[player] |= 1 << index
+        board['hash'] ^= ZOBRISTKEYS[player][index]
+        board['heights'][column] = row + 1
+        board['moves'] += 1
+        board['history'].append(column)
+        lines = board['lines']
+        code = LINECODES[player]
+        changes = LINESCORECHANGES[player]
+        score = board['score']
+        for line in CELLLINES[index]:
+            count = lines[line]
+            score += changes[count]
+            lines[line] = count + code
+        board['score'] = score
+
+def undoMove(board):
+    # Takes back the last move made on the board and returns its column.
+    column = board['history'].pop()
+    row = board['heights'][column] - 1
+    index = column * COLUMNBITS + row
+    player = RED if board[RED] >> index & 1 else BLACK
+    board[player] ^= 1 << index
+    board['hash'] ^= ZOBRISTKEYS[player][index]
+    board['heights'][column] = row
+    board['moves'] -= 1
+    lines = board['lines']
+    code = LINECODES[player]
+    changes = LINESCORECHANGES[player]
+    score = board['score']
+    for line in CELLLINES[index]:
+        count = lines[line] - code
+        score -= changes[count]
+        lines[line] = count
+    board['score'] = score
+    return column
 
 def drawBoard(board, extraToken=None):
+    # Draws the board (and extraToken, the token being dropped or dragged)
+    # and returns the list of rects of the window that changed, to pass to
+    # pygame.display.update(). The frame comes from the cached layers: when
+    # only the moving token changed since the last frame, just the spaces it
+    # left and entered are redrawn.
+    global boardLayerKey, lastTokenRect
+    startTime = time.perf_counter()
+    if not LAYEREDRENDERING:
+        blits = drawBoardByParts(board, extraToken)
+        dirtyRects = [DISPLAYSURF.get_rect()]
+    else:
+        blits = 0
+        dirtyRects = []
+        key = (board[RED], board[BLACK], CURRENTTURN)
+        if key != boardLayerKey:
+            blits += drawBoardLayers(board)
+            boardLayerKey = key
+            DISPLAYSURF.blit(FRAMELAYER, (0, 0))
+            blits += 1
+            dirtyRects.append(DISPLAYSURF.get_rect())
+        elif lastTokenRect is not None:
+            DISPLAYSURF.blit(FRAMELAYER, lastTokenRect, lastTokenRect)
+            blits += 1
+            dirtyRects.append(lastTokenRect)
+        lastTokenRect = None
+
+        if extraToken:
+            tokenRect = pygame.Rect(extraToken['x'], extraToken['y'], SPACESIZE, SPACESIZE)
+            tokenImg = REDTOKENIMG if extraToken['color'] == RED else BLACKTOKENIMG
+            # The moving token goes between the tokens and the board overlay.
+            DISPLAYSURF.blit(TOKENLAYER, tokenRect, tokenRect)
+            DISPLAYSURF.blit(tokenImg, tokenRect)
+            blits += 2
+            overlayRect = tokenRect.clip(BOARDRECT)
+            if overlayRect.width and overlayRect.height:
+                DISPLAYSURF.blit(BOARDOVERLAY, overlayRect, overlayRect.move(-XMARGIN, -YMARGIN))
+                blits += 1
+            for pileImg, pileRect in ((REDTOKENIMG, REDPILERECT), (BLACKTOKENIMG, BLACKPILERECT)):
+                pileClip = tokenRect.clip(pileRect)
+                if pileClip.width and pileClip.height:
+                    DISPLAYSURF.blit(pileImg, pileClip, pileClip.move(-pileRect.left, -pileRect.top))
+                    blits += 1
+            dirtyRects.append(tokenRect)
+            lastTokenRect = tokenRect
+
+    renderStats['frames'] += 1
+    renderStats['blits'] += blits
+    renderStats['time'] += time.perf_counter() - startTime
+    return dirtyRects
+
+def drawBoardLayers(board):
+    # Redraws TOKENLAYER and FRAMELAYER for the board and returns how many
+    # blits it took.
+    TOKENLAYER.fill(BGCOLOR)
+
+    # Display current player's turn
+    if CURRENTTURN is not None:
+        turnText = 'Player' if CURRENTTURN == HUMAN else 'Computer'
+        turnSurf = BASICFONT.render('Turn: ' + turnText, True, TEXTCOLOR)
+        turnRect = turnSurf.get_rect()
+        turnRect.topleft = (10, 10)
+        TOKENLAYER.blit(turnSurf, turnRect)
+
+    # draw existing tokens
+    blits = 1
+    for x in range(BOARDWIDTH):
+        for y in range(BOARDHEIGHT):
+            token = getTokenAt(board, x, y)
+            if token != EMPTY:
+                TOKENLAYER.blit(REDTOKENIMG if token == RED else BLACKTOKENIMG,
+                                (XMARGIN + x*SPACESIZE, YMARGIN + y*SPACESIZE))
+                blits += 1
+
+    # draw the board overlay and token piles on top
+    FRAMELAYER.blit(TOKENLAYER, (0, 0))
+    FRAMELAYER.blit(BOARDOVERLAY, BOARDRECT)
+    FRAMELAYER.blit(REDTOKENIMG, REDPILERECT)
+    FRAMELAYER.blit(BLACKTOKENIMG, BLACKPILERECT)
+    return blits + 4
+
+def drawBoardByParts(board, extraToken=None):
+    # Draws the whole window space by space, the way drawBoard() did before
+    # LAYEREDRENDERING, and returns how many blits it took.
     DISPLAYSURF.fill(BGCOLOR)
+    blits = 0
 
     # Display current player's turn
     if CURRENTTURN is not None:
@@ -138,16 +414,20 @@ def drawBoard(board, extraToken=None):
         turnRect = turnSurf.get_rect()
         turnRect.topleft = (10, 10)
         DISPLAYSURF.blit(turnSurf, turnRect)
+        blits += 1
 
     # draw existing tokens
     spaceRect = pygame.Rect(0, 0, SPACESIZE, SPACESIZE)
     for x in range(BOARDWIDTH):
         for y in range(BOARDHEIGHT):
             spaceRect.topleft = (XMARGIN + x*SPACESIZE, YMARGIN + y*SPACESIZE)
-            if board[x][y] == RED:
+            token = getTokenAt(board, x, y)
+            if token == RED:
                 DISPLAYSURF.blit(REDTOKENIMG, spaceRect)
-            elif board[x][y] == BLACK:
+                blits += 1
+            elif token == BLACK:
                 DISPLAYSURF.blit(BLACKTOKENIMG, spaceRect)
+                blits += 1
 
     # draw the token being dropped or dragged
     if extraToken:
@@ -155,59 +435,98 @@ def drawBoard(board, extraToken=None):
             DISPLAYSURF.blit(REDTOKENIMG, (extraToken['x'], extraToken['y'], SPACESIZE, SPACESIZE))
         elif extraToken['color'] == BLACK:
             DISPLAYSURF.blit(BLACKTOKENIMG, (extraToken['x'], extraToken['y'], SPACESIZE, SPACESIZE))
+        blits += 1
 
     # draw the board overlay
     for x in range(BOARDWIDTH):
         for y in range(BOARDHEIGHT):
             spaceRect.topleft = (XMARGIN + x*SPACESIZE, YMARGIN + y*SPACESIZE)
             DISPLAYSURF.blit(BOARDIMG, spaceRect)
+    blits += BOARDWIDTH * BOARDHEIGHT
 
     # draw token piles
     DISPLAYSURF.blit(REDTOKENIMG, REDPILERECT)
     DISPLAYSURF.blit(BLACKTOKENIMG, BLACKPILERECT)
+    return blits + 2
 
-def getNewBoard():
-    board = []
-    for x in range(BOARDWIDTH):
-        board.append([EMPTY] * BOARDHEIGHT)
+def getBoardFromMoves(moves, firstTile=RED):
+    # Returns the board after playing the columns in moves (a list of ints
+    # or a string of digits), with firstTile and the other color taking turns.
+    board = getNewBoard()
+    tile = firstTile
+    for column in moves:
+        makeMove(board, tile, int(column))
+        tile = RED if tile == BLACK else BLACK
     return board
 
+def getNewBoard():
+    # RED and BLACK map to the bitboard of that player's tokens, 'heights'
+    # holds how many tokens are in each column, 'moves' the total, 'hash' the
+    # Zobrist hash of the tokens and 'history' the columns played, in order,
+    # so that undoMove() can take them back. 'lines' holds the count of
+    # every winning line (see LINECODES) and 'score' red's threat score.
+    return {RED: 0, BLACK: 0, 'heights': [0] * BOARDWIDTH, 'moves': 0, 'hash': 0, 'history': [],
+            'lines': [0] * len(WINNINGLINES), 'score': 0}
+
+def copyBoard(board):
+    return {RED: board[RED], BLACK: board[BLACK], 'heights': board['heights'][:],
+            'moves': board['moves'], 'hash': board['hash'], 'history': board['history'][:],
+            'lines': board['lines'][:], 'score': board['score']}
+
+def getTokenAt(board, x, y):
+    # Returns RED, BLACK or EMPTY for the space at x, y (y = 0 is the top row).
+    bit = 1 << (x * COLUMNBITS + BOARDHEIGHT - 1 - y)
+    if board[RED] & bit:
+        return RED
+    if board[BLACK] & bit:
+        return BLACK
+    return EMPTY
+
 def getHumanMove(board, isFirstMove):
     draggingToken = False
     tokenx = tokeny = None
     while True:
         for event in pygame.event.get():
             if event.type == QUIT:
-                pygame.quit()
-                sys.exit()
+                terminate()
             elif event.type == MOUSEBUTTONDOWN and not draggingToken and REDPILERECT.collidepoint(event.pos):
                 draggingToken = True
                 tokenx, tokeny = event.pos
             elif event.type == MOUSEMOTION and draggingToken:
                 tokenx, tokeny = event.pos
+            elif event.type == KEYUP and event.key in (K_u, K_BACKSPACE) and not draggingToken:
+                # take back the computer's last move and the player's move before it
+                if len(board['history']) >= 2:
+                    undoMove(board)
+                    undoMove(board)
+                    if PONDERING:
+                        startPondering(board)
             elif event.type == MOUSEBUTTONUP and draggingToken:
                 if tokeny < YMARGIN and tokenx > XMARGIN and tokenx < WINDOWWIDTH - XMARGIN:
                     column = int((tokenx - XMARGIN) / SPACESIZE)
                     if isValidMove(board, column):
                         animateDroppingToken(board, column, RED)
-                        board[column][getLowestEmptySpace(board, column)] = RED
-                        drawBoard(board)
-                        pygame.display.update()
+                        makeMove(board, RED, column)
+                        pygame.display.update(drawBoard(board))
                         return
                 tokenx = tokeny = None
                 draggingToken = False
         if tokenx is not None and tokeny is not None:
-            drawBoard(board, {'x': tokenx - SPACESIZE//2,
-                              'y': tokeny - SPACESIZE//2,
-                              'color': RED})
+            dirtyRects = drawBoard(board, {'x': tokenx - SPACESIZE//2,
+                                           'y': tokeny - SPACESIZE//2,
+                                           'color': RED})
         else:
-            drawBoard(board)
+            dirtyRects = drawBoard(board)
 
         if isFirstMove:
             DISPLAYSURF.blit(ARROWIMG, ARROWRECT)
+            dirtyRects.append(ARROWRECT)
 
-        pygame.display.update()
-        FPSCLOCK.tick()
+        pygame.display.update(dirtyRects)
+        if PONDERING:
+            FPSCLOCK.tick(FPS) # leave the CPU to the pondering
+        else:
+            FPSCLOCK.tick()
 
 def animateDroppingToken(board, column, color):
     x = XMARGIN + column * SPACESIZE
@@ -219,102 +538,727 @@ def animateDroppingToken(board, column, color):
         dropSpeed += 0.5
         if int((y - YMARGIN) / SPACESIZE) >= targetRow:
             return
-        drawBoard(board, {'x': x, 'y': y, 'color': color})
-        pygame.display.update()
+        pygame.display.update(drawBoard(board, {'x': x, 'y': y, 'color': color}))
         FPSCLOCK.tick()
 
 def animateComputerMoving(board, column):
+    # column is the column to move the token to, or a Future that will give
+    # it once the background search is done. The token rises from its pile
+    # right away and drifts back and forth over the board until the column
+    # is known, with the window still handling events. Returns the column.
     x = BLACKPILERECT.left
     y = BLACKPILERECT.top
     speed = 1.0
     while y > YMARGIN - SPACESIZE:
         y -= int(speed)
         speed += 0.5
-        drawBoard(board, {'x': x, 'y': y, 'color': BLACK})
-        pygame.display.update()
+        checkForQuit()
+        pygame.display.update(drawBoard(board, {'x': x, 'y': y, 'color': BLACK}))
         FPSCLOCK.tick()
     y = YMARGIN - SPACESIZE
+
+    if isinstance(column, concurrent.futures.Future):
+        future = column
+        direction = -1
+        while not future.done():
+            x += direction * HOVERSPEED
+            if x < XMARGIN:
+                direction = 1
+            elif x > WINDOWWIDTH - XMARGIN - SPACESIZE:
+                direction = -1
+            checkForQuit()
+            pygame.display.update(drawBoard(board, {'x': x, 'y': y, 'color': BLACK}))
+            FPSCLOCK.tick(FPS) # leave the CPU to the search
+        column = future.result()
+
+    targetx = XMARGIN + column * SPACESIZE
     speed = 1.0
-    while x > XMARGIN + column * SPACESIZE:
-        x -= int(speed)
+    while x != targetx:
+        if x > targetx:
+            x = max(targetx, x - int(speed))
+        else:
+            x = min(targetx, x + int(speed))
         speed += 0.5
-        drawBoard(board, {'x': x, 'y': y, 'color': BLACK})
-        pygame.display.update()
+        checkForQuit()
+        pygame.display.update(drawBoard(board, {'x': x, 'y': y, 'color': BLACK}))
         FPSCLOCK.tick()
     animateDroppingToken(board, column, BLACK)
+    return column
+
+def getBackgroundPool():
+    # The process the computer thinks in while the window keeps running.
+    # It stays the same for the whole program, so its transposition table
+    # and Monte Carlo tree carry over from one move to the next.
+    global backgroundPool
+    if backgroundPool is None:
+        backgroundPool = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+    return backgroundPool
+
+def startPondering(board):
+    # Queues a background search for the computer's answer to every move
+    # the player could make next, most central first. The searches run in
+    # their own process while the player is deciding, and the answers wait
+    # in ponderCache under the hash of the board they answer.
+    stopPondering()
+    pool = getPonderPool()
+    for column in MOVEORDER:
+        if isValidMove(board, column):
+            child = copyBoard(board)
+            makeMove(child, RED, column)
+            ponderCache[child['hash']] = pool.submit(ponderMove, child)
+
+def stopPondering():
+    # Cancels the pondering searches that haven't started yet.
+    for future in ponderCache.values():
+        future.cancel()
+    ponderCache.clear()
 
-def getComputerMove(board):
-    potentialMoves = getPotentialMoves(board, BLACK, DIFFICULTY)
-    bestFitness = -1
-    for i in range(BOARDWIDTH):
-        if potentialMoves[i] > bestFitness and isValidMove(board, i):
-            bestFitness = potentialMoves[i]
-    bestCols = [i for i in range(BOARDWIDTH)
-                if potentialMoves[i] == bestFitness and isValidMove(board, i)]
-    return random.choice(bestCols)
-
-def getPotentialMoves(board, tile, lookAhead):
-    if lookAhead == 0 or isBoardFull(board):
-        return [0] * BOARDWIDTH
+def ponderMove(board):
+    # Runs in the pondering process. Returns the column and the seconds the
+    # search took, which is how long the player won't have to wait.
+    column = getComputerMove(board)
+    return column, searchStats['time']
+
+def getPonderedMove(board):
+    # Called once the player has moved. Returns the pondered column if that
+    # search is done, a Future of it if it is running, or None if the
+    # player's move wasn't pondered or its search hasn't started; then a
+    # fresh search is quicker than waiting behind the others. The other
+    # pondering is stopped.
+    # The pondering process runs the searches one at a time in the order
+    # they were queued, so the first one not done is the one running. The
+    # executor hands the process the next one early, and that one reports
+    # running() too, but it has to wait its turn.
+    running = next((future for future in ponderCache.values() if not future.done()), None)
+    future = ponderCache.pop(board['hash'], None)
+    stopPondering()
+    if future is not None and not future.done() and future is not running:
+        future.cancel()
+        future = None
+    if future is None or future.cancelled():
+        ponderStats['misses'] += 1
+        return None
+    ponderStats['hits'] += 1
+    if future.done():
+        column, seconds = future.result()
+        ponderStats['saved'] += seconds
+        return column
+
+    askedTime = time.perf_counter()
+    answer = concurrent.futures.Future()
+    def finishAnswer(future):
+        column, seconds = future.result()
+        ponderStats['saved'] += max(0.0, seconds - (time.perf_counter() - askedTime))
+        answer.set_result(column)
+    future.add_done_callback(finishAnswer)
+    return answer
+
+def getPonderPool():
+    global ponderPool
+    if ponderPool is None:
+        ponderPool = concurrent.futures.ProcessPoolExecutor(max_workers=1)
+    return ponderPool
+
+def checkForQuit():
+    for event in pygame.event.get(QUIT): # get all the QUIT events
+        terminate() # terminate if any QUIT events are present
+
+def terminate():
+    # Shuts down the search processes before quitting. Otherwise the exit
+    # waits for every pondering search still queued to run first.
+    stopPondering()
+    for pool in (ponderPool, backgroundPool, workerPool):
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    pygame.quit()
+    sys.exit()
+
+transpositionTable = None # created by the first getComputerMove() call
+mctsTree = None # the Monte Carlo search tree kept from the last getMCTSMove() call
+openingBook = None # opened by the first getBookMove() call, False if there is none
+solvedDatabase = None # opened by the first getSolvedMove() call, False if there is none
+workerPool = None # created by the first parallel getComputerMove() call
+backgroundPool = None # created by the first getBackgroundPool() call
+ponderPool = None # created by the first getPonderPool() call
+ponderCache = {} # board hash after a possible player move -> Future of (column, seconds)
+ponderStats = {'hits': 0, 'misses': 0, 'saved': 0.0} # saved is in seconds
+workerPoolSize = 0
+
+class SearchTimeout(Exception):
+    pass
+
+def getComputerMove(board, tile=BLACK, timeLimit=THINKINGTIME, maxDepth=DIFFICULTY, table=None,
+                    workers=WORKERS, useBook=USEOPENINGBOOK, engine=ENGINE, useDatabase=USESOLVEDDATABASE):
+    # Boards solved by fourinarowsolver.py are played from its database.
+    # With engine set to MCTS the move comes from getMCTSMove(). Otherwise:
+    # Iterative deepening: search one move deeper on every pass, and when
+    # timeLimit milliseconds run out play the best move of the deepest pass
+    # that finished. The first pass always finishes so there is a move.
+    # Positions are remembered in table (a shared one by default), which
+    # also makes every pass start with the best move of the one before.
+    global transpositionTable
+    if useDatabase:
+        startTime = time.perf_counter()
+        move = getSolvedMove(board, tile)
+        if move is not None:
+            searchStats.update(source='database', time=time.perf_counter() - startTime)
+            return move
+    if useBook:
+        startTime = time.perf_counter()
+        move = getBookMove(board, tile)
+        if move is not None:
+            searchStats.update(nodes=0, depth=0, score=0, source='book',
+                               time=time.perf_counter() - startTime)
+            return move
+    searchStats['source'] = 'search'
+    if engine == MCTS:
+        return getMCTSMove(board, tile, timeLimit)
+    if workers > 1:
+        return getParallelComputerMove(board, tile, timeLimit, maxDepth, workers)
+    if table is None:
+        if transpositionTable is None:
+            transpositionTable = getNewTranspositionTable(maxMegabytes=TABLEMEGABYTES)
+        table = transpositionTable
+    table['age'] += 1
+    startTime = time.perf_counter()
+    deadline = startTime + timeLimit / 1000
     enemy = RED if tile == BLACK else BLACK
-    scores = [0] * BOARDWIDTH
-    for move in range(BOARDWIDTH):
-        dupe = copy.deepcopy(board)
-        if not isValidMove(dupe, move):
-            continue
-        makeMove(dupe, tile, move)
-        if isWinner(dupe, tile):
-            scores[move] = 1
+    searchStats['nodes'] = 0
+    searchStats['depth'] = 0
+    bestMove = None
+    startMoves = board['moves']
+    maxDepth = min(maxDepth, BOARDWIDTH * BOARDHEIGHT - board['moves'])
+    for depth in range(1, maxDepth + 1):
+        try:
+            move, score = searchRoot(board, tile, enemy, depth,
+                                     deadline if bestMove is not None else None, table)
+        except SearchTimeout:
+            # The search plays moves on the board itself and gets cut off
+            # in the middle, so take back the moves it didn't get to undo.
+            while board['moves'] > startMoves:
+                undoMove(board)
             break
-        if isBoardFull(dupe):
-            scores[move] = 0
+        bestMove = move
+        searchStats['depth'] = depth
+        searchStats['score'] = score
+        if abs(score) > WINSCORE - BOARDWIDTH * BOARDHEIGHT - 1:
+            break # the game is already decided, looking deeper won't change it
+    searchStats['time'] = time.perf_counter() - startTime
+    return bestMove
+
+def getMCTSMove(board, tile, timeLimit=THINKINGTIME, iterations=None):
+    # Monte Carlo tree search: each iteration walks down the tree picking
+    # children by the UCT formula, adds one new child, plays random moves
+    # from there until the game ends and counts the result in every node on
+    # the way back up. Stops after iterations playouts (but at least one, so
+    # there is a move) if that is given and when timeLimit milliseconds run
+    # out otherwise, and plays the most visited move. The subtree of the position reached is kept in mctsTree
+    # so the next call, after the player's reply, doesn't start from scratch.
+    global mctsTree
+    startTime = time.perf_counter()
+    deadline = startTime + timeLimit / 1000
+    root = getMCTSRoot(board, tile)
+    total = BOARDWIDTH * BOARDHEIGHT
+    playouts = 0
+    while True:
+        if iterations is not None:
+            if playouts >= max(1, iterations):
+                break
+        elif playouts & 63 == 0 and playouts > 0 and time.perf_counter() > deadline:
+            break
+        playouts += 1
+
+        # Walk down the tree while every move of the node has a child.
+        node = root
+        path = [root]
+        tokens = {RED: board[RED], BLACK: board[BLACK]}
+        heights = board['heights'][:]
+        moves = board['moves']
+        toMove = tile
+        while node['result'] is None and not node['untried']:
+            node = selectMCTSChild(node)
+            tokens[toMove] |= 1 << (node['column'] * COLUMNBITS + heights[node['column']])
+            heights[node['column']] += 1
+            moves += 1
+            toMove = RED if toMove == BLACK else BLACK
+            path.append(node)
+
+        # Add a child for one of the moves not tried yet.
+        if node['result'] is None:
+            column = node['untried'].pop()
+            tokens[toMove] |= 1 << (column * COLUMNBITS + heights[column])
+            heights[column] += 1
+            moves += 1
+            child = getNewMCTSNode(column, toMove, heights)
+            if hasFourInARow(tokens[toMove]):
+                child['result'] = toMove
+            elif moves == total:
+                child['result'] = DRAW
+            node['children'][column] = child
+            node = child
+            toMove = RED if toMove == BLACK else BLACK
+            path.append(node)
+
+        if node['result'] is None:
+            result = playRandomGame(tokens[RED], tokens[BLACK], heights, moves, toMove)
         else:
-            for cm in range(BOARDWIDTH):
-                dupe2 = copy.deepcopy(dupe)
-                if not isValidMove(dupe2, cm):
-                    continue
-                makeMove(dupe2, enemy, cm)
-                if isWinner(dupe2, enemy):
-                    scores[move] = -1
+            result = node['result']
+        for node in path:
+            node['visits'] += 1
+            if result == node['player']:
+                node['wins'] += 1
+            elif result == DRAW:
+                node['wins'] += 0.5
+
+    bestMove = max(root['children'].values(), key=lambda child: child['visits'])['column']
+    mctsTree = {'root': root, 'history': board['history'][:]}
+    seconds = time.perf_counter() - startTime
+    searchStats.update(nodes=playouts, depth=0, score=0, time=seconds,
+                       playoutsPerSecond=playouts / max(seconds, 1e-9))
+    return bestMove
+
+def getMCTSRoot(board, tile):
+    # Returns the node of the kept tree that matches the board, or a new one
+    # if the board didn't come from the kept tree's position.
+    if mctsTree is not None:
+        history = mctsTree['history']
+        node = mctsTree['root']
+        if board['history'][:len(history)] == history:
+            for column in board['history'][len(history):]:
+                node = node['children'].get(column)
+                if node is None:
                     break
+            if node is not None and node['player'] != tile and node['result'] is None:
+                return node
+    enemy = RED if tile == BLACK else BLACK
+    return getNewMCTSNode(None, enemy, board['heights'])
+
+def getNewMCTSNode(column, player, heights):
+    # player is the one who played column to reach this node, and 'wins'
+    # counts the playouts they won (a draw counts half). 'untried' lists the
+    # moves without a child yet, most central last since it is tried first.
+    return {'column': column, 'player': player, 'visits': 0, 'wins': 0.0, 'children': {},
+            'untried': [x for x in reversed(MOVEORDER) if heights[x] < BOARDHEIGHT], 'result': None}
+
+def selectMCTSChild(node):
+    logVisits = math.log(node['visits'])
+    bestScore = -1
+    for child in node['children'].values():
+        score = child['wins'] / child['visits'] + MCTSEXPLORATION * math.sqrt(logVisits / child['visits'])
+        if score > bestScore:
+            bestScore = score
+            bestChild = child
+    return bestChild
+
+def playRandomGame(red, black, heights, moves, tile):
+    # Plays random moves from the position until the game ends, working on
+    # the bitboards directly, and returns the winner (or DRAW).
+    tokens = red if tile == RED else black
+    otherTokens = black if tile == RED else red
+    heights = heights[:]
+    openColumns = [x for x in range(BOARDWIDTH) if heights[x] < BOARDHEIGHT]
+    total = BOARDWIDTH * BOARDHEIGHT
+    while moves < total:
+        i = int(random.random() * len(openColumns))
+        column = openColumns[i]
+        row = heights[column]
+        tokens |= 1 << (column * COLUMNBITS + row)
+        heights[column] = row + 1
+        if row + 1 == BOARDHEIGHT:
+            openColumns[i] = openColumns[-1]
+            openColumns.pop()
+        moves += 1
+        if hasFourInARow(tokens):
+            return tile
+        tokens, otherTokens = otherTokens, tokens
+        tile = RED if tile == BLACK else BLACK
+    return DRAW
+
+def getBookMove(board, tile):
+    # Returns the opening book's move for tile on this board, or None if the
+    # book doesn't have the position (or there is no book).
+    global openingBook
+    if openingBook is None:
+        openingBook = openPositionFile(OPENINGBOOKFILE) or False
+    if not openingBook or board['moves'] >= openingBook['plies']:
+        return None
+    key, mirrored = getCanonicalKey(board, tile)
+    move = lookupPositionFile(openingBook, key)
+    if move is None:
+        return None
+    if mirrored:
+        move = BOARDWIDTH - 1 - move
+    if not isValidMove(board, move):
+        return None
+    return move
+
+def getSolvedMove(board, tile):
+    # Returns the best move for tile from the solved database of this board
+    # size, or None if there is no database. The database holds the value of
+    # every position the game can reach (see getSolvedValue()), so the best
+    # move is the one that leaves the enemy the worst position.
+    global solvedDatabase
+    if solvedDatabase is None:
+        solvedDatabase = openPositionFile(SOLVEDDATABASEFILE % (BOARDWIDTH, BOARDHEIGHT)) or False
+    if not solvedDatabase:
+        return None
+    enemy = RED if tile == BLACK else BLACK
+    bestMove = None
+    bestValue = None
+    for column in MOVEORDER:
+        if not isValidMove(board, column):
+            continue
+        if isWinningMove(board, tile, column):
+            bestMove = column
+            bestValue = BOARDWIDTH * BOARDHEIGHT - board['moves']
+            break
+        makeMove(board, tile, column)
+        if isBoardFull(board):
+            value = 0
+        else:
+            value = lookupPositionFile(solvedDatabase, getCanonicalKey(board, enemy)[0])
+            if value is not None:
+                value = -getSolvedValue(value)
+        undoMove(board)
+        if value is None:
+            return None # not a position the database was made for
+        if bestValue is None or value > bestValue:
+            bestMove = column
+            bestValue = value
+    searchStats.update(nodes=0, depth=BOARDWIDTH * BOARDHEIGHT - board['moves'])
+    if bestValue > 0:
+        searchStats['score'] = WINSCORE - (BOARDWIDTH * BOARDHEIGHT + 1 - bestValue)
+    elif bestValue < 0:
+        searchStats['score'] = -WINSCORE + (BOARDWIDTH * BOARDHEIGHT + 1 + bestValue)
+    else:
+        searchStats['score'] = 0
+    return bestMove
+
+def getSolvedValue(byte):
+    # Solved databases store the value of a position for the player about to
+    # move as 128 plus: 0 for a draw, and for a win (or minus it for a loss)
+    # BOARDWIDTH * BOARDHEIGHT + 1 less the number of tokens on the board
+    # when the game is won, so faster wins have bigger values.
+    return byte - 128
+
+def getParallelComputerMove(board, tile, timeLimit, maxDepth, workers):
+    # Root splitting: the legal columns are dealt out to the worker processes,
+    # and each worker deepens its columns until the time runs out, reporting
+    # the score of every column at every depth it finished. Scores are only
+    # comparable at the same depth, so the move is picked at the deepest depth
+    # every column finished, and ties go to the column that comes first in
+    # MOVEORDER. The pick doesn't depend on which worker happened to be first.
+    startTime = time.perf_counter()
+    searchStats['nodes'] = 0
+    searchStats['depth'] = 0
+    columns = [column for column in MOVEORDER if isValidMove(board, column)]
+    for column in columns:
+        if isWinningMove(board, tile, column):
+            searchStats['depth'] = 1
+            searchStats['score'] = WINSCORE - board['moves'] - 1
+            searchStats['time'] = time.perf_counter() - startTime
+            return column
+
+    pool = getWorkerPool(workers)
+    maxDepth = min(maxDepth, BOARDWIDTH * BOARDHEIGHT - board['moves'])
+    tasks = min(workers, len(columns))
+    futures = [pool.submit(searchRootColumns, board, tile, columns[i::tasks], timeLimit, maxDepth)
+               for i in range(tasks)]
+    scores = {}
+    for future in futures:
+        columnScores, nodes = future.result()
+        scores.update(columnScores)
+        searchStats['nodes'] += nodes
+
+    depth = min(len(scores[column]) for column in columns)
+    bestMove = max(columns, key=lambda column: scores[column][depth - 1])
+    searchStats['depth'] = depth
+    searchStats['score'] = scores[bestMove][depth - 1]
+    searchStats['time'] = time.perf_counter() - startTime
+    return bestMove
+
+def getWorkerPool(workers):
+    global workerPool, workerPoolSize
+    if workerPool is None or workerPoolSize != workers:
+        if workerPool is not None:
+            workerPool.shutdown()
+        workerPool = concurrent.futures.ProcessPoolExecutor(max_workers=workers)
+        workerPoolSize = workers
+    return workerPool
+
+def searchRootColumns(board, tile, columns, timeLimit, maxDepth):
+    # Runs in a worker process for getParallelComputerMove(). Returns a dict
+    # of each column's list of scores, one per depth finished in time, and
+    # the number of nodes searched. Every task gets its own fresh table so
+    # the result doesn't depend on what the worker searched before.
+    deadline = time.perf_counter() + timeLimit / 1000
+    enemy = RED if tile == BLACK else BLACK
+    table = getNewTranspositionTable(maxMegabytes=TABLEMEGABYTES)
+    searchStats['nodes'] = 0
+    children = {}
+    for column in columns:
+        children[column] = copyBoard(board)
+        makeMove(children[column], tile, column)
+    scores = dict((column, []) for column in columns)
+    try:
+        for depth in range(1, maxDepth + 1):
+            for column in columns:
+                if depth > 1 and abs(scores[column][-1]) > WINSCORE - BOARDWIDTH * BOARDHEIGHT - 1:
+                    score = scores[column][-1] # decided already, a deeper look won't change it
                 else:
-                    results = getPotentialMoves(dupe2, tile, lookAhead - 1)
-                    scores[move] += sum(results) / BOARDWIDTH**2
-    return scores
+                    score = -negamax(children[column], enemy, tile, depth - 1, -WINSCORE, WINSCORE,
+                                     deadline if depth > 1 else None, table)
+                scores[column].append(score)
+    except SearchTimeout:
+        pass
+    return scores, searchStats['nodes']
+
+def searchRoot(board, tile, enemy, depth, deadline, table):
+    alpha = -WINSCORE
+    bestMove = None
+    key = board['hash'] ^ SIDEKEYS[tile]
+    entry = probeTable(table, key)
+    order = MOVEORDER if entry is None else MOVEORDERFROM[entry[4]]
+    for column in order:
+        if not isValidMove(board, column):
+            continue
+        if isWinningMove(board, tile, column):
+            return column, WINSCORE - board['moves'] - 1
+        if bestMove is None:
+            bestMove = column
+        makeMove(board, tile, column)
+        score = -negamax(board, enemy, tile, depth - 1, -WINSCORE, -alpha, deadline, table)
+        undoMove(board)
+        if score > alpha:
+            alpha = score
+            bestMove = column
+    storeTable(table, key, depth, EXACT, alpha, bestMove)
+    return bestMove, alpha
+
+def negamax(board, tile, enemy, depth, alpha, beta, deadline, table):
+    # Returns the score of the board for tile, who is about to move. Scores
+    # are exact inside the alpha-beta window and only bounds outside of it.
+    searchStats['nodes'] += 1
+    if deadline is not None and searchStats['nodes'] & 1023 == 0 and time.perf_counter() > deadline:
+        raise SearchTimeout()
+    if isBoardFull(board):
+        return 0
+    for column in MOVEORDER:
+        if isValidMove(board, column) and isWinningMove(board, tile, column):
+            return WINSCORE - board['moves'] - 1
+    if depth == 0:
+        return evaluateBoard(board, tile)
+
+    key = board['hash'] ^ SIDEKEYS[tile]
+    order = MOVEORDER
+    entry = probeTable(table, key)
+    if entry is not None:
+        order = MOVEORDERFROM[entry[4]]
+        if entry[1] >= depth:
+            score = entry[3]
+            if entry[2] == EXACT:
+                return score
+            elif entry[2] == LOWERBOUND and score >= beta:
+                return score
+            elif entry[2] == UPPERBOUND and score <= alpha:
+                return score
+
+    origAlpha = alpha
+    bestScore = -WINSCORE
+    bestMove = None
+    for column in order:
+        if not isValidMove(board, column):
+            continue
+        makeMove(board, tile, column)
+        score = -negamax(board, enemy, tile, depth - 1, -beta, -alpha, deadline, table)
+        undoMove(board)
+        if score > bestScore:
+            bestScore = score
+            bestMove = column
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+
+    if bestScore <= origAlpha:
+        flag = UPPERBOUND
+    elif bestScore >= beta:
+        flag = LOWERBOUND
+    else:
+        flag = EXACT
+    storeTable(table, key, depth, flag, bestScore, bestMove)
+    return bestScore
+
+def getNewTranspositionTable(maxEntries=None, maxMegabytes=None, policy=TWOTIER):
+    # The table is a fixed-size list of slots indexed by the board hash, so
+    # it never grows past its cap. Give the cap as a number of entries or in
+    # megabytes. With TWOTIER every index has two slots instead of one.
+    if maxEntries is None:
+        maxEntries = int(maxMegabytes * 1024 * 1024 / TABLEENTRYBYTES)
+    slotsPerIndex = 2 if policy == TWOTIER else 1
+    size = max(1, maxEntries // slotsPerIndex)
+    return {'size': size, 'policy': policy, 'slots': [None] * (size * slotsPerIndex),
+            'age': 0, 'hits': 0, 'misses': 0, 'collisions': 0, 'stores': 0}
+
+def probeTable(table, key):
+    # Returns the entry for the board hash key, or None if it isn't stored.
+    slots = table['slots']
+    if table['policy'] == TWOTIER:
+        index = (key % table['size']) * 2
+        entry = slots[index]
+        if entry is None or entry[0] != key:
+            entry = slots[index + 1]
+    else:
+        entry = slots[key % table['size']]
+    if entry is not None and entry[0] == key:
+        table['hits'] += 1
+        return entry
+    table['misses'] += 1
+    return None
+
+def storeTable(table, key, depth, flag, score, move):
+    slots = table['slots']
+    age = table['age']
+    entry = (key, depth, flag, score, move, age)
+    if table['policy'] == TWOTIER:
+        index = (key % table['size']) * 2
+        old = slots[index]
+        if old is None or old[0] == key or old[1] <= depth or old[5] != age:
+            # The deep slot takes the new entry, and the entry it held
+            # moves down to the always-replace slot.
+            if old is not None and old[0] != key:
+                replaced = slots[index + 1]
+                if replaced is not None and replaced[0] != old[0]:
+                    table['collisions'] += 1
+                slots[index + 1] = old
+            slots[index] = entry
+        else:
+            old = slots[index + 1]
+            if old is not None and old[0] != key:
+                table['collisions'] += 1
+            slots[index + 1] = entry
+    else:
+        index = key % table['size']
+        old = slots[index]
+        if old is not None and old[0] != key:
+            if old[1] > depth and old[5] == age:
+                return # keep the deeper entry from this search
+            table['collisions'] += 1
+        slots[index] = entry
+    table['stores'] += 1
+
+def getPositionKey(board, tile):
+    # Returns a number that is unique to the position, seen from tile who is
+    # about to move. In a column of h tokens the mask of all tokens is
+    # 2**h - 1 and tile's tokens are some number from 0 to 2**h - 1, so
+    # their sum is one of 2**h - 1 ... 2**(h + 1) - 2. Those ranges don't
+    # overlap for different heights, so the sum gives away both the height
+    # and which tokens are tile's. It is below 2**COLUMNBITS, so it never
+    # carries over into the next column.
+    return board[tile] + (board[RED] | board[BLACK])
+
+def getCanonicalKey(board, tile):
+    # A board and its mirror image have the same best moves (mirrored), so
+    # position files only store the smaller of the two keys. Returns that
+    # key and whether it is the mirror image's.
+    key = getPositionKey(board, tile)
+    mirroredKey = 0
+    for x in range(BOARDWIDTH):
+        column = (key >> (x * COLUMNBITS)) & COLUMNMASK
+        mirroredKey |= column << ((BOARDWIDTH - 1 - x) * COLUMNBITS)
+    if mirroredKey < key:
+        return mirroredKey, True
+    return key, False
+
+def writePositionFile(filename, values, plies=0):
+    # values is a dict of position keys to one-byte values. plies is the
+    # number of moves the file covers positions for (0 for all of them).
+    with open(filename, 'wb') as fileObj:
+        fileObj.write(POSITIONFILEHEADER.pack(POSITIONFILEMAGIC, BOARDWIDTH, BOARDHEIGHT,
+                                              KEYBYTES, plies, len(values)))
+        for key in sorted(values):
+            fileObj.write(key.to_bytes(KEYBYTES, 'big'))
+            fileObj.write(bytes((values[key],)))
+
+def openPositionFile(filename):
+    # Maps a file made by writePositionFile() into memory. Returns None if
+    # the file doesn't exist or was made for a different board size.
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as fileObj:
+        data = mmap.mmap(fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, width, height, keyBytes, plies, records = POSITIONFILEHEADER.unpack_from(data)
+    if magic != POSITIONFILEMAGIC or (width, height, keyBytes) != (BOARDWIDTH, BOARDHEIGHT, KEYBYTES):
+        data.close()
+        return None
+    return {'data': data, 'plies': plies or BOARDWIDTH * BOARDHEIGHT + 1, 'records': records}
+
+def lookupPositionFile(positionFile, key):
+    # Binary search over the sorted records. Returns the value stored for
+    # key, or None if it isn't in the file.
+    data = positionFile['data']
+    recordSize = KEYBYTES + 1
+    target = key.to_bytes(KEYBYTES, 'big')
+    low, high = 0, positionFile['records']
+    while low < high:
+        middle = (low + high) // 2
+        offset = POSITIONFILEHEADER.size + middle * recordSize
+        if data[offset:offset + KEYBYTES] < target:
+            low = middle + 1
+        else:
+            high = middle
+    offset = POSITIONFILEHEADER.size + low * recordSize
+    if low < positionFile['records'] and data[offset:offset + KEYBYTES] == target:
+        return data[offset + KEYBYTES]
+    return None
 
 def getLowestEmptySpace(board, column):
-    for y in range(BOARDHEIGHT-1, -1, -1):
-        if board[column][y] is EMPTY:
-            return y
-    return -1
+    height = board['heights'][column]
+    if height == BOARDHEIGHT:
+        return -1
+    return BOARDHEIGHT - 1 - height
 
 def isValidMove(board, column):
-    return 0 <= column < BOARDWIDTH and board[column][0] is EMPTY
+    return 0 <= column < BOARDWIDTH and board['heights'][column] < BOARDHEIGHT
 
 def isBoardFull(board):
-    return all(board[x][y] is not EMPTY for x in range(BOARDWIDTH) for y in range(BOARDHEIGHT))
+    return board['moves'] == BOARDWIDTH * BOARDHEIGHT
+
+def isWinningMove(board, tile, column):
+    # Returns True if tile dropping into column would connect four.
+    return hasFourInARow(board[tile] | (1 << (column * COLUMNBITS + board['heights'][column])))
 
 def isWinner(board, tile):
-    # horizontal
-    for x in range(BOARDWIDTH-3):
-        for y in range(BOARDHEIGHT):
-            if all(board[x+i][y] == tile for i in range(4)):
-                return True
-    # vertical
-    for x in range(BOARDWIDTH):
-        for y in range(BOARDHEIGHT-3):
-            if all(board[x][y+i] == tile for i in range(4)):
-                return True
-    # diag /
-    for x in range(BOARDWIDTH-3):
-        for y in range(3, BOARDHEIGHT):
-            if all(board[x+i][y-i] == tile for i in range(4)):
-                return True
-    # diag \
-    for x in range(BOARDWIDTH-3):
-        for y in range(BOARDHEIGHT-3):
-            if all(board[x+i][y+i] == tile for i in range(4)):
-                return True
+    return hasFourInARow(board[tile])
+
+def isLastMoveWinner(board):
+    # Returns True if the last move made connected four. Only the counts of
+    # the lines that pass through the last token are checked.
+    if not board['history']:
+        return False
+    column = board['history'][-1]
+    index = column * COLUMNBITS + board['heights'][column] - 1
+    full = 4 * LINECODES[RED if board[RED] >> index & 1 else BLACK]
+    lines = board['lines']
+    for line in CELLLINES[index]:
+        if lines[line] == full:
+            return True
+    return False
+
+def evaluateBoard(board, tile):
+    # Returns how good the board looks for tile when nobody has won: the
+    # lines tile could still finish, weighted by how many tokens they have,
+    # less the enemy's. makeMove() keeps the total up to date as it goes.
+    return board['score'] if tile == RED else -board['score']
+
+def hasFourInARow(tokens):
+    # Shifting the bitboard by one step in a direction and ANDing it with
+    # itself leaves the tokens that have a neighbor in that direction. Doing
+    # it again with twice the step leaves only the starts of four in a row.
+    for shift in WINSHIFTS:
+        pairs = tokens & (tokens >> shift)
+        if pairs & (pairs >> (2 * shift)):
+            return True
     return False
 
 if __name__ == '__main__':
@@ -0,0 +1,153 @@
+# Four-In-A-Row arena
+# Plays two computer players against each other without a window, over as
+# many games as asked for, and reports how they did and how fast they were.
+#
+#   python fourinarowarena.py search random --games 1000 --time 50
+#
+# A player is one of the names in ENGINES or "module:function" for any
+# function that takes (board, tile, timeLimit) and returns a column.
+
+import argparse, importlib, os, random, sys, time, concurrent.futures
+import fourinarow
+from fourinarow import (RED, BLACK, BOARDWIDTH, getNewBoard, makeMove, isValidMove,
+                        isWinningMove, isLastMoveWinner, isBoardFull, getComputerMove, searchStats)
+
+
+def getSearchMove(board, tile, timeLimit):
+    return getComputerMove(board, tile, timeLimit)
+
+def getSearchMoveWithoutBook(board, tile, timeLimit):
+    return getComputerMove(board, tile, timeLimit, useBook=False)
+
+def getMCTSMove(board, tile, timeLimit):
+    return getComputerMove(board, tile, timeLimit, engine=fourinarow.MCTS)
+
+def getRandomMove(board, tile, timeLimit):
+    return random.choice([column for column in range(BOARDWIDTH) if isValidMove(board, column)])
+
+ENGINES = {'search': getSearchMove,
+           'search-nobook': getSearchMoveWithoutBook,
+           'mcts': getMCTSMove,
+           'random': getRandomMove}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play two Four-In-A-Row AIs against each other.')
+    parser.add_argument('engineA', help='first player (%s or module:function)' % ', '.join(ENGINES))
+    parser.add_argument('engineB', help='second player')
+    parser.add_argument('--games', type=int, default=100, help='games to play (default: 100)')
+    parser.add_argument('--time', type=int, default=100,
+                        help='milliseconds per move for each player (default: 100)')
+    parser.add_argument('--random-plies', type=int, default=2,
+                        help='random moves that open every game (default: 2)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the random openings')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='games played at once (default: all cores)')
+    parser.add_argument('--min-score', type=float, default=None,
+                        help='exit with an error if engineA scores less than this '
+                             '(wins plus half the draws, as a fraction of the games)')
+    args = parser.parse_args()
+
+    results = runMatch((args.engineA, args.engineB), args.games, args.time,
+                       args.random_plies, args.seed, args.workers)
+    printResults((args.engineA, args.engineB), results)
+    if args.min_score is not None and results['score'] < args.min_score:
+        print('FAIL: %s scored %.3f, needed %.3f' % (args.engineA, results['score'], args.min_score))
+        sys.exit(1)
+
+
+def getEngine(name):
+    if name in ENGINES:
+        return ENGINES[name]
+    moduleName, functionName = name.split(':')
+    return getattr(importlib.import_module(moduleName), functionName)
+
+
+def runMatch(engineNames, games, timeLimit, randomPlies, seed, workers):
+    # Plays the games in a pool of processes and returns a dict of the
+    # totals. Engine A plays red (and moves first) in the even-numbered
+    # games, and every opening is played twice with the colors swapped.
+    startTime = time.perf_counter()
+    wins = [0, 0]
+    draws = 0
+    moves = [0, 0]
+    seconds = [0.0, 0.0]
+    nodes = [0, 0]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        gameNumbers = range(games)
+        for winner, stats in pool.map(playGame, gameNumbers, [engineNames] * games,
+                                      [timeLimit] * games, [randomPlies] * games,
+                                      [seed] * games, chunksize=4):
+            if winner is None:
+                draws += 1
+            else:
+                wins[winner] += 1
+            for i in range(2):
+                moves[i] += stats[i][0]
+                seconds[i] += stats[i][1]
+                nodes[i] += stats[i][2]
+    elapsed = time.perf_counter() - startTime
+    return {'games': games, 'wins': wins[0], 'draws': draws, 'losses': wins[1],
+            'score': (wins[0] + draws / 2) / games,
+            'msPerMove': [1000 * seconds[i] / max(1, moves[i]) for i in range(2)],
+            'nodesPerSecond': [nodes[i] / max(seconds[i], 1e-9) for i in range(2)],
+            'gamesPerSecond': games / elapsed}
+
+
+def playGame(gameNumber, engineNames, timeLimit, randomPlies, seed):
+    # Runs in a worker process. Returns the index of the winning engine (or
+    # None for a draw) and a [moves, seconds, nodes] list for each engine.
+    # Every engine gets its own transposition table and Monte Carlo tree,
+    # empty at the start of the game, so neither learns from the other's
+    # searches (which would blur the difference between two variants).
+    engines = [getEngine(name) for name in engineNames]
+    opening = random.Random(seed * 1000003 + gameNumber // 2)
+    random.seed(seed * 1000003 + gameNumber)
+    tables = [None, None]
+    trees = [None, None]
+
+    board = getNewBoard()
+    tile = RED
+    for ply in range(randomPlies):
+        columns = [column for column in range(BOARDWIDTH)
+                   if isValidMove(board, column) and not isWinningMove(board, tile, column)]
+        if not columns:
+            break
+        makeMove(board, tile, opening.choice(columns))
+        tile = RED if tile == BLACK else BLACK
+
+    redPlayer = gameNumber % 2
+    stats = [[0, 0.0, 0], [0, 0.0, 0]]
+    while not isBoardFull(board):
+        player = redPlayer if tile == RED else 1 - redPlayer
+        fourinarow.transpositionTable = tables[player]
+        fourinarow.mctsTree = trees[player]
+        searchStats['nodes'] = 0 # an engine that doesn't search counts no nodes
+        startTime = time.perf_counter()
+        column = engines[player](board, tile, timeLimit)
+        stats[player][1] += time.perf_counter() - startTime
+        tables[player] = fourinarow.transpositionTable
+        trees[player] = fourinarow.mctsTree
+        stats[player][0] += 1
+        stats[player][2] += searchStats['nodes']
+        if not isValidMove(board, column):
+            return 1 - player, stats # an illegal move loses the game
+        makeMove(board, tile, column)
+        if isLastMoveWinner(board):
+            return player, stats
+        tile = RED if tile == BLACK else BLACK
+    return None, stats
+
+
+def printResults(engineNames, results):
+    print('%s vs %s: %s games' % (engineNames[0], engineNames[1], results['games']))
+    print('  %s wins, %s draws, %s losses (score %.3f)' % (
+        results['wins'], results['draws'], results['losses'], results['score']))
+    for i in range(2):
+        print('  %-16s %8.2f ms/move %12.0f nodes/sec' % (
+            engineNames[i], results['msPerMove'][i], results['nodesPerSecond'][i]))
+    print('  %.2f games/sec' % results['gamesPerSecond'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+# Four-In-A-Row batch evaluator
+# Scores many positions at once with NumPy, for analysing searches and
+# recorded games. Positions are an (N, BOARDWIDTH, BOARDHEIGHT) int8 array
+# holding EMPTY, RED or BLACK for every space (y = 0 is the top row, like
+# getTokenAt() in fourinarow.py).
+#
+#   python fourinarowbatch.py --positions 100000     benchmark against isWinner()
+
+import argparse, random, time
+import numpy
+import fourinarow
+from fourinarow import BOARDWIDTH, BOARDHEIGHT, WINNINGLINES, THREEWEIGHT, TWOWEIGHT, getTokenAt
+
+EMPTY = 0
+RED = 1
+BLACK = -1
+
+WINWEIGHT = fourinarow.WINSCORE
+
+# Every winning line as the four flat indexes of its spaces in a board array
+# that has been reshaped to (N, BOARDWIDTH * BOARDHEIGHT).
+LINEINDEXES = numpy.array([[x * BOARDHEIGHT + y for x, y in line] for line in WINNINGLINES],
+                          dtype=numpy.intp)
+
+# Indexed by EMPTY, RED and BLACK (-1 wraps around to the last item).
+TOKENCODES = numpy.array([0, 1, 5], dtype=numpy.int8)
+
+BATCHSIZE = 65536 # positions to evaluate per step, to bound the temporary arrays
+
+
+def evaluateBoards(boards):
+    # Returns a dict of arrays with one value per position: 'redWins' and
+    # 'blackWins' (bool), 'redThrees', 'blackThrees', 'redTwos' and
+    # 'blackTwos' (number of lines that are one or two tokens short of a win
+    # with the rest empty) and 'score' (red's threats and wins minus black's).
+    boards = numpy.asarray(boards, dtype=numpy.int8)
+    results = {}
+    for start in range(0, len(boards), BATCHSIZE):
+        for name, values in evaluateBatch(boards[start:start + BATCHSIZE]).items():
+            results.setdefault(name, []).append(values)
+    if not results:
+        return evaluateBatch(boards) # no positions, but still return the arrays
+    return dict((name, numpy.concatenate(values)) for name, values in results.items())
+
+
+def evaluateBatch(boards):
+    # Gives every space a code (0 empty, 1 red, 5 black) and looks up the
+    # four spaces of every line of every board in one step. The sum of a
+    # line's codes tells exactly how many tokens of each color it holds, so
+    # everything else is comparisons of the (N, lines) array of sums.
+    codes = TOKENCODES[boards.reshape(len(boards), BOARDWIDTH * BOARDHEIGHT)]
+    sums = codes[:, LINEINDEXES].sum(axis=2, dtype=numpy.int8)
+    redWins = (sums == 4).any(axis=1)
+    blackWins = (sums == 20).any(axis=1)
+    redThrees = (sums == 3).sum(axis=1)
+    blackThrees = (sums == 15).sum(axis=1)
+    redTwos = (sums == 2).sum(axis=1)
+    blackTwos = (sums == 10).sum(axis=1)
+    score = (THREEWEIGHT * (redThrees - blackThrees) + TWOWEIGHT * (redTwos - blackTwos)
+             + WINWEIGHT * (redWins.astype(numpy.int64) - blackWins))
+    return {'redWins': redWins, 'blackWins': blackWins,
+            'redThrees': redThrees, 'blackThrees': blackThrees,
+            'redTwos': redTwos, 'blackTwos': blackTwos, 'score': score}
+
+
+def getBoardArray(boards):
+    # Converts a list of fourinarow.py boards to an (N, BOARDWIDTH,
+    # BOARDHEIGHT) int8 array.
+    array = numpy.zeros((len(boards), BOARDWIDTH, BOARDHEIGHT), dtype=numpy.int8)
+    for i, board in enumerate(boards):
+        for x in range(BOARDWIDTH):
+            for y in range(BOARDHEIGHT):
+                token = getTokenAt(board, x, y)
+                if token == fourinarow.RED:
+                    array[i, x, y] = RED
+                elif token == fourinarow.BLACK:
+                    array[i, x, y] = BLACK
+    return array
+
+
+def getRandomBoards(count, seed=0):
+    # Plays count random games, each stopped after a random number of moves
+    # or when someone wins, and returns the boards they ended on.
+    rand = random.Random(seed)
+    boards = []
+    for i in range(count):
+        board = fourinarow.getNewBoard()
+        tile = fourinarow.RED
+        for move in range(rand.randint(0, BOARDWIDTH * BOARDHEIGHT)):
+            columns = [column for column in range(BOARDWIDTH) if fourinarow.isValidMove(board, column)]
+            fourinarow.makeMove(board, tile, rand.choice(columns))
+            if fourinarow.isLastMoveWinner(board) or fourinarow.isBoardFull(board):
+                break
+            tile = fourinarow.BLACK if tile == fourinarow.RED else fourinarow.RED
+        boards.append(board)
+    return boards
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the batch evaluator against isWinner().')
+    parser.add_argument('--positions', type=int, default=100000,
+                        help='random positions to evaluate (default: 100000)')
+    args = parser.parse_args()
+
+    boards = getRandomBoards(args.positions)
+    array = getBoardArray(boards)
+
+    startTime = time.perf_counter()
+    scalarWins = [(fourinarow.isWinner(board, fourinarow.RED), fourinarow.isWinner(board, fourinarow.BLACK))
+                  for board in boards]
+    scalarSeconds = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    results = evaluateBoards(array)
+    batchSeconds = time.perf_counter() - startTime
+
+    assert [tuple(wins) for wins in scalarWins] == list(zip(results['redWins'].tolist(),
+                                                            results['blackWins'].tolist()))
+    print('%s positions, %s lines each' % (args.positions, len(WINNINGLINES)))
+    print('  isWinner() x2:   %8.3f s  %12.0f positions/sec  (win flags only)' % (
+        scalarSeconds, args.positions / scalarSeconds))
+    print('  evaluateBoards(): %7.3f s  %12.0f positions/sec  (wins, threats and score)' % (
+        batchSeconds, args.positions / batchSeconds))
+
+
+if __name__ == '__main__':
+    main()
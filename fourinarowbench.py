@@ -0,0 +1,235 @@
+# Four-In-A-Row AI benchmarks
+# Measures how fast the computer player of fourinarow.py searches.
+#
+#   python fourinarowbench.py --speedup         how the parallel search scales
+#   python fourinarowbench.py --render          drawBoard() frame cost, old vs layered
+#   python fourinarowbench.py --suite --save    record a baseline of the search suite
+#   python fourinarowbench.py --suite           compare the search against the baseline
+#
+# --render needs the game's images in the current directory. Set the
+# environment variable SDL_VIDEODRIVER=dummy to run it without a window.
+#
+# --suite searches every position of SUITEPOSITIONS to every depth of
+# --levels and records the time, nodes, memory allocated and move of each.
+# It exits with an error if the suite's nodes/sec fell more than --threshold
+# below the baseline's, so it can guard optimizations of the search.
+
+import argparse, json, os, sys, time, tracemalloc
+import pygame
+import fourinarow
+from fourinarow import (RED, BLACK, SPACESIZE, XMARGIN, YMARGIN, TABLEMEGABYTES, getBoardFromMoves,
+                        getComputerMove, getNewTranspositionTable, searchStats, renderStats)
+
+# Positions given as the columns played so far, red moving first.
+SPEEDUPPOSITIONS = ('', '3332', '33243425', '3323344215')
+SUITEPOSITIONS = (('opening', ''),
+                  ('opening-2', '33'),
+                  ('middlegame', '33243425'),
+                  ('middlegame-2', '332334421'),
+                  ('tactical-win', '3323344215'), # red wins at once in column 0
+                  ('tactical-block', '32425'),    # black must block column 6
+                  ('near-full', '103511146115454322463026246003'))
+SUITELEVELS = (2, 4, 6, 8) # search depths, like the original DIFFICULTY setting
+BASELINEFILE = '4row_bench.json'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Four-In-A-Row AI.')
+    parser.add_argument('--speedup', action='store_true',
+                        help='time a fixed-depth search with 1 to --workers processes')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='most worker processes to try (default: all cores)')
+    parser.add_argument('--depth', type=int, default=9,
+                        help='search depth for the speedup curve (default: 9)')
+    parser.add_argument('--render', action='store_true',
+                        help='time drawing the computer-move animation both ways')
+    parser.add_argument('--frames', type=int, default=2000,
+                        help='frames to draw for --render (default: 2000)')
+    parser.add_argument('--suite', action='store_true',
+                        help='search the fixed positions and compare with the baseline')
+    parser.add_argument('--levels', type=int, nargs='+', default=SUITELEVELS,
+                        help='search depths for --suite (default: %s)' % ' '.join(map(str, SUITELEVELS)))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='times to time every search for --suite, keeping the fastest (default: 3)')
+    parser.add_argument('--baseline', default=BASELINEFILE,
+                        help='baseline file for --suite (default: %s)' % BASELINEFILE)
+    parser.add_argument('--save', action='store_true',
+                        help='write the --suite results to the baseline file instead of comparing')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fail --suite if nodes/sec is lower than the baseline by more than '
+                             'this fraction (default: 0.1)')
+    args = parser.parse_args()
+
+    if args.speedup:
+        printSpeedupCurve(measureSpeedup(args.workers, args.depth))
+    if args.render:
+        printRenderResults(measureRendering(args.frames))
+    if args.suite:
+        results = runSuite(args.levels, args.repeat)
+        if args.save or not os.path.exists(args.baseline):
+            with open(args.baseline, 'w') as fileObj:
+                json.dump(results, fileObj, indent=1, sort_keys=True)
+            printSuiteResults(results, None)
+            print('Saved the baseline to %s.' % args.baseline)
+        else:
+            with open(args.baseline) as fileObj:
+                baseline = json.load(fileObj)
+            printSuiteResults(results, baseline)
+            change = results['nodesPerSecond'] / baseline['nodesPerSecond'] - 1
+            if change < -args.threshold:
+                print('FAIL: nodes/sec is %.1f%% below the baseline (threshold %.1f%%)' % (
+                    -100 * change, 100 * args.threshold))
+                sys.exit(1)
+    if not (args.speedup or args.render or args.suite):
+        parser.print_help()
+
+
+def getTileToMove(moves):
+    return RED if len(moves) % 2 == 0 else BLACK
+
+
+def measureSpeedup(maxWorkers, depth, positions=SPEEDUPPOSITIONS):
+    # Searches every position to the same depth with 1, 2, ... maxWorkers
+    # processes and returns a list of (workers, seconds, nodes) tuples. The
+    # depth is fixed and the time limit is huge so every run does the same
+    # amount of work, and every run starts from empty transposition tables.
+    results = []
+    for workers in range(1, maxWorkers + 1):
+        if workers > 1:
+            # Start the pool's processes before the clock starts.
+            getComputerMove(getBoardFromMoves(''), RED, timeLimit=10**9, maxDepth=2, workers=workers)
+        seconds = 0.0
+        nodes = 0
+        for moves in positions:
+            fourinarow.transpositionTable = None
+            startTime = time.perf_counter()
+            getComputerMove(getBoardFromMoves(moves), getTileToMove(moves),
+                            timeLimit=10**9, maxDepth=depth, workers=workers)
+            seconds += time.perf_counter() - startTime
+            nodes += searchStats['nodes']
+        results.append((workers, seconds, nodes))
+    return results
+
+
+def printSpeedupCurve(results):
+    baseSeconds = results[0][1]
+    print('workers   seconds   speedup   efficiency   nodes/sec')
+    for workers, seconds, nodes in results:
+        speedup = baseSeconds / seconds
+        print('%7d %9.3f %8.2fx %11.0f%% %11.0f' % (workers, seconds, speedup,
+                                                    100 * speedup / workers, nodes / seconds))
+
+
+def runSuite(levels, repeat):
+    # Searches every suite position to every depth in levels. Every search
+    # starts from a new transposition table, made before the clock starts
+    # (and before tracemalloc, so its slot list doesn't count).
+    # The search is timed repeat times and the fastest kept, then run once
+    # more under tracemalloc (which slows it down) to count the memory it
+    # allocates. Returns a dict of the cases and the suite's totals.
+    cases = {}
+    totalNodes = 0
+    totalSeconds = 0.0
+    for name, moves in SUITEPOSITIONS:
+        tile = getTileToMove(moves)
+        for depth in levels:
+            def search(table):
+                board = getBoardFromMoves(moves)
+                startTime = time.perf_counter()
+                move = getComputerMove(board, tile, timeLimit=10**9, maxDepth=depth, table=table,
+                                       workers=1, useBook=False, engine=fourinarow.ALPHABETA,
+                                       useDatabase=False)
+                return move, time.perf_counter() - startTime
+
+            seconds = min(search(getNewTranspositionTable(maxMegabytes=TABLEMEGABYTES))[1]
+                          for i in range(repeat))
+            table = getNewTranspositionTable(maxMegabytes=TABLEMEGABYTES)
+            tracemalloc.start()
+            move = search(table)[0]
+            allocated, peak = tracemalloc.get_traced_memory()
+            blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+            tracemalloc.stop()
+            nodes = searchStats['nodes']
+            cases['%s/%s' % (name, depth)] = {'move': move, 'nodes': nodes, 'seconds': seconds,
+                                              'nodesPerSecond': nodes / seconds, 'peakBytes': peak,
+                                              'liveBlocks': blocks}
+            totalNodes += nodes
+            totalSeconds += seconds
+    return {'cases': cases, 'nodes': totalNodes, 'seconds': totalSeconds,
+            'nodesPerSecond': totalNodes / totalSeconds}
+
+
+def printSuiteResults(results, baseline):
+    # Prints every case, and with a baseline how its nodes/sec changed and
+    # whether it searched a different number of nodes or chose another move.
+    print('case                 move      nodes   ms/move     nodes/sec  peak KB  change')
+    for name, case in results['cases'].items():
+        change = ''
+        old = baseline['cases'].get(name) if baseline else None
+        if old:
+            change = '%+6.1f%%' % (100 * (case['nodesPerSecond'] / old['nodesPerSecond'] - 1))
+            if old['nodes'] != case['nodes']:
+                change += '  nodes were %s' % old['nodes']
+            if old['move'] != case['move']:
+                change += '  move was %s' % old['move']
+        print('%-20s %4s %10s %9.2f %13.0f %8.0f  %s' % (
+            name, case['move'], case['nodes'], 1000 * case['seconds'], case['nodesPerSecond'],
+            case['peakBytes'] / 1024, change))
+    print('total: %s nodes in %.3f s, %.0f nodes/sec' % (results['nodes'], results['seconds'],
+                                                         results['nodesPerSecond']), end='')
+    if baseline:
+        print(' (baseline %.0f, %+.1f%%)' % (baseline['nodesPerSecond'],
+                                             100 * (results['nodesPerSecond'] / baseline['nodesPerSecond'] - 1)))
+    else:
+        print()
+
+
+def getAnimationTokens(column):
+    # Yields the extraToken dicts animateComputerMoving() draws for column.
+    x = fourinarow.BLACKPILERECT.left
+    y = fourinarow.BLACKPILERECT.top
+    speed = 1.0
+    while y > YMARGIN - SPACESIZE:
+        y -= int(speed)
+        speed += 0.5
+        yield {'x': x, 'y': y, 'color': BLACK}
+    y = YMARGIN - SPACESIZE
+    speed = 1.0
+    while x > XMARGIN + column * SPACESIZE:
+        x -= int(speed)
+        speed += 0.5
+        yield {'x': x, 'y': y, 'color': BLACK}
+
+
+def measureRendering(frames):
+    # Draws frames of the computer's token sliding across a middlegame
+    # board, first space by space and then from the cached layers, and
+    # returns a dict of (blits per frame, ms per frame, ms per frame with
+    # the display update) for both.
+    fourinarow.initGraphics()
+    board = getBoardFromMoves('3323344215')
+    results = {}
+    for layered in (False, True):
+        fourinarow.LAYEREDRENDERING = layered
+        fourinarow.boardLayerKey = None
+        renderStats.update(frames=0, blits=0, time=0.0)
+        startTime = time.perf_counter()
+        while renderStats['frames'] < frames:
+            for extraToken in getAnimationTokens(0):
+                pygame.display.update(fourinarow.drawBoard(board, extraToken))
+        seconds = time.perf_counter() - startTime
+        drawn = renderStats['frames']
+        results['layered' if layered else 'by parts'] = (renderStats['blits'] / drawn,
+                                                         1000 * renderStats['time'] / drawn,
+                                                         1000 * seconds / drawn)
+    return results
+
+
+def printRenderResults(results):
+    print('drawBoard()   blits/frame   ms/frame   ms/frame with display update')
+    for name, (blits, drawMs, frameMs) in results.items():
+        print('%-10s %13.1f %10.3f %12.3f' % (name, blits, drawMs, frameMs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+# Four-In-A-Row opening book maker
+# Searches every position of the first few moves ahead of time and saves the
+# best move of each one to the file fourinarow.py plays its openings from.
+#
+#   python fourinarowbook.py --plies 6 --time 2000
+
+import argparse, os, time, concurrent.futures
+import fourinarow
+from fourinarow import (RED, BLACK, OPENINGBOOKFILE, BOARDWIDTH, getNewBoard, copyBoard,
+                        makeMove, isValidMove, isWinner, isBoardFull, getCanonicalKey,
+                        getComputerMove, writePositionFile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Make the Four-In-A-Row opening book.')
+    parser.add_argument('--plies', type=int, default=4,
+                        help='cover positions with fewer than this many tokens (default: 4)')
+    parser.add_argument('--time', type=int, default=1000,
+                        help='milliseconds to search each position (default: 1000)')
+    parser.add_argument('--depth', type=int, default=fourinarow.DIFFICULTY,
+                        help='deepest to search each position')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='processes to search with (default: all cores)')
+    parser.add_argument('--output', default=OPENINGBOOKFILE,
+                        help='file to write (default: %s)' % OPENINGBOOKFILE)
+    args = parser.parse_args()
+
+    startTime = time.perf_counter()
+    positions = getOpeningPositions(args.plies)
+    print('Searching %s positions...' % len(positions))
+    book = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as pool:
+        moves = pool.map(getBookEntry, positions, [args.time] * len(positions),
+                         [args.depth] * len(positions), chunksize=16)
+        for key, move in moves:
+            book[key] = move
+    writePositionFile(args.output, book, args.plies)
+    print('Wrote %s positions (%s bytes) to %s in %.1f seconds.' % (
+        len(book), os.path.getsize(args.output), args.output, time.perf_counter() - startTime))
+
+
+def getOpeningPositions(plies):
+    # Returns a (board, tile to move) pair for every position with fewer than
+    # plies tokens that the game can reach without anyone having won. Mirror
+    # images count as the same position and are only returned once.
+    positions = []
+    seen = set()
+    layer = [(getNewBoard(), RED)]
+    for ply in range(plies):
+        nextLayer = []
+        for board, tile in layer:
+            key = getCanonicalKey(board, tile)[0]
+            if key in seen:
+                continue
+            seen.add(key)
+            positions.append((board, tile))
+            enemy = RED if tile == BLACK else BLACK
+            for column in range(BOARDWIDTH):
+                if isValidMove(board, column):
+                    child = copyBoard(board)
+                    makeMove(child, tile, column)
+                    if not isWinner(child, tile) and not isBoardFull(child):
+                        nextLayer.append((child, enemy))
+        layer = nextLayer
+    return positions
+
+
+def getBookEntry(position, timeLimit, maxDepth):
+    # Runs in a worker process. Returns the position's book key and move,
+    # mirrored if the key is the mirror image's.
+    board, tile = position
+    move = getComputerMove(board, tile, timeLimit, maxDepth, workers=1, useBook=False)
+    key, mirrored = getCanonicalKey(board, tile)
+    if mirrored:
+        move = BOARDWIDTH - 1 - move
+    return key, move
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+# Four-In-A-Row game server
+# Plays Four-In-A-Row against many clients at once, without a window. Clients
+# connect over TCP (or a Unix socket) and send one JSON object per line; the
+# server answers every request with one JSON object per line.
+#
+#   python fourinarowserver.py serve --port 4444 --workers 4 --time 100
+#   python fourinarowserver.py load --port 4444 --clients 200 --games 2000
+#
+# Requests (any request may also carry an "id", which the answer echoes):
+#
+#   {"op": "new", "first": "human"}   start a game; "computer" lets the AI open
+#   {"op": "move", "game": 7, "column": 3}   play a column, get the AI's answer
+#   {"op": "quit", "game": 7}         forget a game
+#   {"op": "stats"}                   sessions, queue and latency percentiles
+#
+# Answers have "ok": true, or "ok": false and an "error". Game answers hold
+# "game", "moves" (every column played so far), "column" (the AI's move, if
+# it made one) and "winner" ("human", "computer", "draw" or null). The human
+# plays red and the computer black.
+#
+# The searches run in a pool of worker processes. At most --max-pending of
+# them are queued or running at once; past that the server stops reading
+# from the clients that asked, so TCP pushes back on them instead of the
+# queue growing without bound.
+
+import argparse, asyncio, collections, json, os, random, time, concurrent.futures
+import fourinarow
+from fourinarow import (RED, BLACK, HUMAN, COMPUTER, DRAW, getBoardFromMoves, makeMove,
+                        isValidMove, isLastMoveWinner, isBoardFull, getComputerMove, searchStats)
+
+DEFAULTPORT = 4444
+LATENCYSAMPLES = 100000 # most recent request latencies kept for the percentiles
+PERCENTILES = (50, 90, 99)
+OPS = ('new', 'move', 'quit', 'stats') # requests are counted and timed by op, anything else as 'invalid'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve Four-In-A-Row games, or load-test a server.')
+    parser.add_argument('mode', choices=('serve', 'load'))
+    parser.add_argument('--host', default='127.0.0.1', help='address to use (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULTPORT,
+                        help='TCP port to use (default: %s)' % DEFAULTPORT)
+    parser.add_argument('--unix', default=None, help='use this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='serve: search processes (default: all cores)')
+    parser.add_argument('--time', type=int, default=100,
+                        help='serve: milliseconds the AI may spend on a move (default: 100)')
+    parser.add_argument('--max-pending', type=int, default=None,
+                        help='serve: searches queued or running at once (default: 2 per worker)')
+    parser.add_argument('--max-sessions', type=int, default=100000,
+                        help='serve: games kept at once (default: 100000)')
+    parser.add_argument('--clients', type=int, default=100,
+                        help='load: connections playing at once (default: 100)')
+    parser.add_argument('--games', type=int, default=1000,
+                        help='load: games to play in all (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='load: seed for the random moves')
+    args = parser.parse_args()
+
+    try:
+        if args.mode == 'serve':
+            server = GameServer(args.workers, args.time, args.max_pending or 2 * args.workers,
+                                args.max_sessions)
+            asyncio.run(server.serve(args.host, args.port, args.unix))
+        else:
+            results = asyncio.run(runLoad(args.host, args.port, args.unix,
+                                          args.clients, args.games, args.seed))
+            printLoadResults(results)
+    except KeyboardInterrupt:
+        pass
+
+
+def searchMove(moves, firstTile, timeLimit):
+    # Runs in a worker process. Every worker keeps its own transposition
+    # table across requests and games; entries are keyed by the tokens and
+    # the player to move, so they hold for any game that reaches them.
+    board = getBoardFromMoves(moves, firstTile)
+    column = getComputerMove(board, BLACK, timeLimit, workers=1)
+    return column, searchStats['nodes']
+
+
+def isInteger(value):
+    # JSON's true and false come back as bools, which Python counts as ints.
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def getPercentiles(samples, percentiles=PERCENTILES):
+    # Returns a dict of percentile -> value (nearest rank) of samples.
+    ordered = sorted(samples)
+    if not ordered:
+        return dict((p, None) for p in percentiles)
+    return dict((p, ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]) for p in percentiles)
+
+
+class GameServer:
+    def __init__(self, workers, timeLimit, maxPending, maxSessions):
+        self.workers = workers
+        self.timeLimit = timeLimit
+        self.maxPending = maxPending
+        self.maxSessions = maxSessions
+        self.pool = None
+        self.searchSlots = None # asyncio.Semaphore of maxPending, made in serve()
+        self.sessions = {} # game number -> {'board', 'first', 'owner'}
+        self.nextGame = 1
+        self.pending = 0
+        self.connections = 0
+        self.counts = collections.Counter() # requests answered, by op
+        self.nodes = 0 # positions searched for all the requests
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCYSAMPLES))
+
+    async def serve(self, host, port, unixPath=None):
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers)
+        self.searchSlots = asyncio.Semaphore(self.maxPending)
+        # Start the worker processes before the first client waits on them.
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, searchMove, [], RED, 1)
+                               for i in range(self.workers)])
+        if unixPath:
+            server = await asyncio.start_unix_server(self.handleClient, path=unixPath)
+            where = unixPath
+        else:
+            server = await asyncio.start_server(self.handleClient, host, port)
+            where = '%s:%s' % (host, port)
+        print('Serving Four-In-A-Row on %s with %s workers, %s ms per move.' % (
+            where, self.workers, self.timeLimit))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            self.printStats()
+
+    async def handleClient(self, reader, writer):
+        # Answers the client's requests one at a time, in order. Games the
+        # client didn't quit are dropped when it disconnects.
+        self.connections += 1
+        owner = object()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                startTime = time.perf_counter()
+                try:
+                    request = json.loads(line)
+                    op = request.get('op')
+                    if not isinstance(op, str):
+                        raise TypeError('op must be a string')
+                    answer = await self.handleRequest(request, owner)
+                except (ValueError, AttributeError, TypeError) as e:
+                    request = {}
+                    op = 'invalid'
+                    answer = {'ok': False, 'error': 'bad request: %s' % e}
+                if 'id' in request:
+                    answer['id'] = request['id']
+                writer.write(json.dumps(answer).encode() + b'\n')
+                await writer.drain()
+                if op not in OPS:
+                    op = 'invalid'
+                self.counts[op] += 1
+                self.latencies[op].append(time.perf_counter() - startTime)
+        except ConnectionError:
+            pass
+        finally:
+            self.connections -= 1
+            for game in [game for game, session in self.sessions.items() if session['owner'] is owner]:
+                del self.sessions[game]
+            writer.close()
+
+    async def handleRequest(self, request, owner):
+        op = request.get('op')
+        if op == 'stats':
+            return self.getStats()
+        if op == 'new':
+            if len(self.sessions) >= self.maxSessions:
+                return {'ok': False, 'error': 'server full'}
+            first = request.get('first', HUMAN)
+            if first not in (HUMAN, COMPUTER):
+                return {'ok': False, 'error': 'first must be "human" or "computer"'}
+            game = self.nextGame
+            self.nextGame += 1
+            firstTile = RED if first == HUMAN else BLACK
+            session = {'board': getBoardFromMoves([], firstTile), 'first': firstTile, 'owner': owner}
+            self.sessions[game] = session
+            column = None
+            if first == COMPUTER:
+                column = await self.playComputerMove(session)
+            return self.getGameAnswer(game, session, column, None)
+
+        game = request.get('game')
+        if not isInteger(game):
+            return {'ok': False, 'error': 'game must be a number'}
+        session = self.sessions.get(game)
+        if session is None or session['owner'] is not owner:
+            return {'ok': False, 'error': 'no such game'}
+        if op == 'quit':
+            del self.sessions[game]
+            return {'ok': True, 'game': game}
+        if op != 'move':
+            return {'ok': False, 'error': 'unknown op %r' % op}
+
+        board = session['board']
+        column = request.get('column')
+        if session.get('winner') is not None:
+            return {'ok': False, 'error': 'game is over'}
+        if session.get('busy'):
+            return {'ok': False, 'error': 'wait for the answer to the last move'}
+        if not isInteger(column) or not isValidMove(board, column):
+            return {'ok': False, 'error': 'invalid move'}
+        makeMove(board, RED, column)
+        winner = self.getWinner(session, HUMAN)
+        column = None
+        if winner is None:
+            column = await self.playComputerMove(session)
+            winner = self.getWinner(session, COMPUTER)
+        return self.getGameAnswer(game, session, column, winner)
+
+    async def playComputerMove(self, session):
+        # Waits for a free search slot, then for a worker to search the move.
+        board = session['board']
+        session['busy'] = True
+        self.pending += 1
+        try:
+            async with self.searchSlots:
+                loop = asyncio.get_running_loop()
+                column, nodes = await loop.run_in_executor(self.pool, searchMove, board['history'],
+                                                           session['first'], self.timeLimit)
+        finally:
+            self.pending -= 1
+            session['busy'] = False
+        self.nodes += nodes
+        makeMove(board, BLACK, column)
+        return column
+
+    def getWinner(self, session, lastPlayer):
+        if isLastMoveWinner(session['board']):
+            session['winner'] = lastPlayer
+        elif isBoardFull(session['board']):
+            session['winner'] = DRAW
+        return session.get('winner')
+
+    def getGameAnswer(self, game, session, column, winner):
+        return {'ok': True, 'game': game, 'moves': session['board']['history'],
+                'column': column, 'winner': winner}
+
+    def getStats(self):
+        latencies = {}
+        for op, samples in self.latencies.items():
+            latencies[op] = dict(('p%s' % p, None if value is None else round(1000 * value, 3))
+                                 for p, value in getPercentiles(samples).items())
+        return {'ok': True, 'sessions': len(self.sessions), 'connections': self.connections,
+                'pending': self.pending, 'maxPending': self.maxPending,
+                'requests': dict(self.counts), 'nodes': self.nodes, 'latencyMs': latencies}
+
+    def printStats(self):
+        stats = self.getStats()
+        print('%s requests served, %s nodes searched' % (sum(stats['requests'].values()), stats['nodes']))
+        for op, percentiles in sorted(stats['latencyMs'].items()):
+            print('  %-8s %s' % (op, '  '.join('%s %.2f ms' % item for item in percentiles.items())))
+
+
+async def runLoad(host, port, unixPath, clients, games, seed):
+    # Plays games against the server from clients connections at once, the
+    # human side moving at random, and returns a dict of what it measured.
+    results = {'games': 0, 'moves': 0, 'errors': 0, 'latencies': [], 'winners': collections.Counter()}
+    gameNumbers = iter(range(games))
+    startTime = time.perf_counter()
+    await asyncio.gather(*[playLoadClient(host, port, unixPath, gameNumbers, random.Random(seed * 1000003 + i),
+                                          results) for i in range(clients)])
+    results['seconds'] = time.perf_counter() - startTime
+
+    reader, writer = await openConnection(host, port, unixPath)
+    results['server'] = await sendRequest(reader, writer, {'op': 'stats'})
+    writer.close()
+    return results
+
+
+async def openConnection(host, port, unixPath):
+    if unixPath:
+        return await asyncio.open_unix_connection(unixPath)
+    return await asyncio.open_connection(host, port)
+
+
+async def sendRequest(reader, writer, request):
+    writer.write(json.dumps(request).encode() + b'\n')
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def playLoadClient(host, port, unixPath, gameNumbers, rand, results):
+    reader, writer = await openConnection(host, port, unixPath)
+    try:
+        for gameNumber in gameNumbers:
+            answer = await sendRequest(reader, writer, {'op': 'new', 'first': rand.choice((HUMAN, COMPUTER))})
+            if not answer['ok']:
+                results['errors'] += 1
+                continue
+            game = answer['game']
+            board = getBoardFromMoves(answer['moves'])
+            while answer['ok'] and answer['winner'] is None:
+                # The board only needs to know which columns are full, so
+                # the colors getBoardFromMoves() gives the tokens don't matter.
+                column = rand.choice([x for x in range(fourinarow.BOARDWIDTH) if isValidMove(board, x)])
+                startTime = time.perf_counter()
+                answer = await sendRequest(reader, writer, {'op': 'move', 'game': game, 'column': column})
+                results['latencies'].append(time.perf_counter() - startTime)
+                results['moves'] += 1
+                if answer['ok']:
+                    board = getBoardFromMoves(answer['moves'])
+            if answer['ok']:
+                results['games'] += 1
+                results['winners'][answer['winner']] += 1
+                await sendRequest(reader, writer, {'op': 'quit', 'game': game})
+            else:
+                results['errors'] += 1
+    finally:
+        writer.close()
+
+
+def printLoadResults(results):
+    percentiles = getPercentiles(results['latencies'], PERCENTILES + (100,))
+    print('%s games, %s moves in %.2f seconds (%s errors)' % (
+        results['games'], results['moves'], results['seconds'], results['errors']))
+    print('  %.2f games/sec, %.1f moves/sec' % (results['games'] / results['seconds'],
+                                                 results['moves'] / results['seconds']))
+    if results['latencies']:
+        print('  move latency: %s' % '  '.join('p%s %.1f ms' % (p, 1000 * value) for p, value
+                                               in percentiles.items()).replace('p100', 'max'))
+    print('  winners: %s' % ', '.join('%s %s' % item for item in sorted(results['winners'].items())))
+    server = results['server']
+    print('  server: %s sessions left, %s nodes searched' % (server['sessions'],
+                                                           server['nodes']))
+
+
+if __name__ == '__main__':
+    main()
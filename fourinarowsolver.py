@@ -0,0 +1,136 @@
+# Four-In-A-Row solver
+# Solves small boards completely and saves the value of every position the
+# game can reach to a database that getComputerMove() plays from perfectly.
+#
+#   python fourinarowsolver.py --sizes 4x4 5x4 4x5
+#   python fourinarowsolver.py --sizes 6x5 --weak
+#
+# A strong solution (the default) knows every position, so the computer plays
+# perfectly whatever the player does. A weak solution only finds out who wins
+# the empty board with perfect play, with an alpha-beta search; it is much
+# cheaper, but saves nothing.
+
+import argparse, os, sys, time
+import fourinarow
+from fourinarow import RED, BLACK
+
+# Stop once this many positions are held in memory, at roughly 100 bytes each.
+DEFAULTMAXPOSITIONS = 20000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solve small Four-In-A-Row boards.')
+    parser.add_argument('--sizes', nargs='+', default=['4x4'],
+                        help='board sizes to solve, as WIDTHxHEIGHT (default: 4x4)')
+    parser.add_argument('--weak', action='store_true',
+                        help='only find the value of the empty board, and save nothing')
+    parser.add_argument('--max-positions', type=int, default=DEFAULTMAXPOSITIONS,
+                        help='give up on a size once it has this many positions '
+                             '(default: %s)' % DEFAULTMAXPOSITIONS)
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(10000)
+    for size in args.sizes:
+        width, height = [int(n) for n in size.lower().split('x')]
+        fourinarow.setBoardSize(width, height)
+        if args.weak:
+            printWeakResult(size, *weakSolve())
+            continue
+        filename = fourinarow.SOLVEDDATABASEFILE % (width, height)
+        startTime = time.perf_counter()
+        try:
+            values = strongSolve(args.max_positions)
+        except PositionLimit:
+            print('%-6s gave up: more than %s positions' % (size, args.max_positions))
+            continue
+        seconds = time.perf_counter() - startTime
+        fourinarow.writePositionFile(filename, values)
+        printStrongResult(size, values, seconds, filename)
+
+
+class PositionLimit(Exception):
+    pass
+
+
+def strongSolve(maxPositions):
+    # Returns a dict of the canonical key of every position the game can
+    # reach without anyone having won (and with empty spaces left) to its
+    # value byte, as getSolvedValue() in fourinarow.py reads it.
+    width = fourinarow.BOARDWIDTH
+    height = fourinarow.BOARDHEIGHT
+    columnBits = fourinarow.COLUMNBITS
+    spaces = width * height
+    moveOrder = fourinarow.MOVEORDER
+    hasFourInARow = fourinarow.hasFourInARow
+    getCanonicalKey = fourinarow.getCanonicalKey
+    heights = [0] * width
+    values = {}
+
+    def solve(tokens, mask, moves):
+        # tokens are the bits of the player about to move, mask the bits of
+        # every token. Returns the position's value for that player.
+        key = getCanonicalKey({RED: tokens, BLACK: mask ^ tokens}, RED)[0]
+        byte = values.get(key)
+        if byte is not None:
+            return byte - 128
+        best = None
+        for column in moveOrder:
+            row = heights[column]
+            if row == height:
+                continue
+            bit = 1 << (column * columnBits + row)
+            if hasFourInARow(tokens | bit):
+                value = spaces - moves # won with moves + 1 tokens on the board
+            elif moves + 1 == spaces:
+                value = 0
+            else:
+                # Every move is searched, not just the best, since the
+                # player may make any of them and the database needs them all.
+                heights[column] = row + 1
+                value = -solve(mask ^ tokens, mask | bit, moves + 1)
+                heights[column] = row
+            if best is None or value > best:
+                best = value
+        values[key] = best + 128
+        if len(values) > maxPositions:
+            raise PositionLimit()
+        return best
+
+    solve(0, 0, 0)
+    return values
+
+
+def weakSolve():
+    # Searches the empty board to the end with getComputerMove(). Returns
+    # the best first move, its score, the nodes searched and the seconds.
+    board = fourinarow.getNewBoard()
+    startTime = time.perf_counter()
+    move = fourinarow.getComputerMove(board, RED, timeLimit=10**12, maxDepth=fourinarow.BOARDWIDTH * fourinarow.BOARDHEIGHT,
+                                      workers=1, useBook=False, engine=fourinarow.ALPHABETA, useDatabase=False)
+    stats = fourinarow.searchStats
+    return move, stats['score'], stats['nodes'], time.perf_counter() - startTime
+
+
+def describeScore(score):
+    # Turns a search score (or a database value, whose sign means the same)
+    # into words, for the player about to move on the empty board.
+    if score == 0:
+        return 'draw'
+    return 'first player %s' % ('wins' if score > 0 else 'loses')
+
+
+def printStrongResult(size, values, seconds, filename):
+    startValue = values[fourinarow.getCanonicalKey(fourinarow.getNewBoard(), RED)[0]] - 128
+    fileBytes = os.path.getsize(filename)
+    print('%-6s %s: %s positions in %.1f s, %s bytes (%.2f bytes/position) in %s' % (
+        size, describeScore(startValue), len(values), seconds, fileBytes,
+        fileBytes / len(values), filename))
+
+
+def printWeakResult(size, move, score, nodes, seconds):
+    print('%-6s %s, best first move column %s: %s nodes in %.1f s' % (
+        size, describeScore(score), move, nodes, seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,11 +3,12 @@
 
 
 
-import random, sys, webbrowser, copy, pygame
+import random, sys, os, time, math, heapq, mmap, struct, argparse, collections, multiprocessing
+import concurrent.futures, webbrowser, numpy, pygame
 from pygame.locals import *
 
-# There are different box sizes, number of boxes, and
-# life depending on the "board size" setting selected.
+# There are different box sizes and number of boxes
+# depending on the "board size" setting selected.
 SMALLBOXSIZE  = 60 # size is in pixels
 MEDIUMBOXSIZE = 20
 LARGEBOXSIZE  = 11
@@ -16,9 +17,32 @@ SMALLBOARDSIZE  = 6 # size is in boxes
 MEDIUMBOARDSIZE = 17
 LARGEBOARDSIZE  = 30
 
-SMALLMAXLIFE  = 10 # number of turns
-MEDIUMMAXLIFE = 30
-LARGEMAXLIFE  = 64
+# Boards bigger than LARGEBOARDSIZE (python inkspill.py --size 2000) are
+# shown through a viewport the size of the large board, which can be
+# scrolled (with the arrow keys or by dragging) and zoomed (with the mouse
+# wheel or the + and - keys). They are drawn in chunks of CHUNKSIZE x
+# CHUNKSIZE boxes, each rendered once and kept until a flood reaches it.
+VIEWPORTSIZE = LARGEBOARDSIZE * LARGEBOXSIZE # pixels across and down
+ZOOMLEVELS = (1, 2, 3, 4, 6, 8, 11, 16) # box sizes in pixels
+CHUNKSIZE = 32 # boxes
+CHUNKCACHEBYTES = 64 * 1024 * 1024 # most bytes of rendered chunks kept
+PANSPEED = 10 # pixels the viewport scrolls per frame an arrow key is held
+HUGESAMPLESIZE = 64 # boxes across the corner solved to give a huge board its life
+
+# Solver settings. The solver finds a short list of colors that floods the
+# whole board, for the hints and for the life a new board gets.
+GREEDY = 'greedy' # always pick the color that floods the most boxes
+BEAM   = 'beam'   # keep the BEAMWIDTH most flooded positions after every move
+ASTAR  = 'astar'  # A* search for the shortest solution, within the budgets
+SOLVERSTRATEGY = BEAM
+BEAMWIDTH = 24
+SOLVERNODES = 200000 # most positions the solver may look at
+SOLVERTIME = 1000 # milliseconds the solver may take
+# Hints are worked out in a separate process after every move, so asking
+# for one (the Hint button or the H key) answers at once. The process is
+# niced by HINTNICENESS so it never takes the CPU from the game.
+BACKGROUNDHINTS = True
+HINTNICENESS = 10
 
 FPS = 30
 WINDOWWIDTH = 640
@@ -29,9 +53,34 @@ PALETTESIZE = 45
 EASY = 0   # arbitrary but unique value
 MEDIUM = 1 # arbitrary but unique value
 HARD = 2   # arbitrary but unique value
+# Every new board is solved, and its life is the solution's length plus
+# this fraction of it (but at least MINEXTRALIFE), by difficulty.
+EXTRALIFE = {EASY: 0.5, MEDIUM: 0.25, HARD: 0.1}
+MINEXTRALIFE = 2
+DIFFICULTYNAMES = {EASY: 'easy', MEDIUM: 'medium', HARD: 'hard'}
+
+# Board packs are files of ready-made boards for one size and difficulty,
+# made by inkspillgen.py. A pack is a header and then one fixed-size record
+# per board: the number of moves the solver needed for it, then its colors.
+# When there is a pack for the board size and difficulty, new games take
+# their boards from it instead of generating and solving one.
+USEBOARDPACKS = True
+BOARDPACKFILE = 'inkspill_%sx%s_%s.pack' # width, height, difficulty name
+BOARDPACKMAGIC = b'INKP'
+BOARDPACKHEADER = struct.Struct('<4sHHBBIQ') # magic, width, height, colors, difficulty, records, seed
+boardPacks = {} # (width, height, difficulty) to the open pack, or False if there is none
+
+# The neighbors a box's color is copied to when generating easier boards,
+# for each of the four directions: the first neighbor's x and y offsets,
+# then the second's (left and up, right and down, up and right, down and left).
+SMOOTHINGNEIGHBORS = numpy.array(((-1, 1, 0, 0),
+                                  (0, 0, -1, 1),
+                                  (0, 0, 1, -1),
+                                  (-1, 1, 0, 0)))
+SMOOTHINGCHOICES = 1000000 # most random choices drawn at once by generateRandomBoards()
 
 difficulty = MEDIUM # game starts in "medium" mode
-maxLife = MEDIUMMAXLIFE
+maxLife = None # number of turns, set by generateNewGame() for every board
 boardWidth = MEDIUMBOARDSIZE
 boardHeight = MEDIUMBOARDSIZE
 
@@ -59,8 +108,19 @@ for i in range(len(COLORSCHEMES)):
 bgColor = COLORSCHEMES[0][0]
 paletteColors =  COLORSCHEMES[0][1:]
 
+boardSurf = None # the board's pixels, kept between drawBoard() calls
+boardSurfBoard = None # a copy of the board boardSurf shows
+boardSurfKey = None # the board size, box size and colors boardSurf was made for
+flashOverlays = {} # color to the surface flashBorderAnimation() blends in
+viewport = None # what part of a huge board is shown, see getViewport()
+hintPool = None # created by the first getHintPool() call
+hintGeneration = None # a shared counter, bumped whenever the hint process's work goes stale
+hintJobs = [] # Futures of the hint process's (optimal, list of (board key, hint))
+hintCache = {} # board key -> (the hint for that board, whether it is the best one)
+
 def main():
     global FPSCLOCK, DISPLAYSURF, LOGOIMAGE, SPOTIMAGE, SETTINGSIMAGE, SETTINGSBUTTONIMAGE, RESETBUTTONIMAGE
+    global HINTBUTTONIMAGE, HINTWAITINGBUTTONIMAGE
 
     pygame.init()
     FPSCLOCK = pygame.time.Clock()
@@ -72,13 +132,19 @@ def main():
     SETTINGSIMAGE = pygame.image.load('inkspillsettings.png')
     SETTINGSBUTTONIMAGE = pygame.image.load('inkspillsettingsbutton.png')
     RESETBUTTONIMAGE = pygame.image.load('inkspillresetbutton.png')
+    HINTBUTTONIMAGE = makeButtonImage('Hint', RESETBUTTONIMAGE.get_size())
+    HINTWAITINGBUTTONIMAGE = makeButtonImage('Hint...', RESETBUTTONIMAGE.get_size())
 
     pygame.display.set_caption('Ink Spill')
     mousex = 0
     mousey = 0
-    mainBoard = generateRandomBoard(boardWidth, boardHeight, difficulty)
+    mainBoard = generateNewGame()
+    mainTracker = getGameTracker(mainBoard)
     life = maxLife
     lastPaletteClicked = None
+    hintColor = None
+    hintWanted = False # the player asked for a hint that isn't ready yet
+    startHints(mainBoard)
 
     while True: # main game loop
         paletteClicked = None
@@ -86,10 +152,13 @@ def main():
 
         # Draw the screen.
         DISPLAYSURF.fill(bgColor)
-        drawLogoAndButtons()
-        drawBoard(mainBoard)
+        drawLogoAndButtons(hintWanted)
+        if viewport is None:
+            drawBoard(mainBoard)
+        else:
+            drawViewport(mainTracker)
         drawLifeMeter(life)
-        drawPalettes()
+        drawPalettes(hintColor)
 
         checkForQuit()
         for event in pygame.event.get(): # event handling loop
@@ -105,20 +174,41 @@ def main():
                                  RESETBUTTONIMAGE.get_width(),
                                  RESETBUTTONIMAGE.get_height()).collidepoint(mousex, mousey):
                     resetGame = True # clicked on Reset button
+                elif viewport is None and getHintButtonRect().collidepoint(mousex, mousey):
+                    hintWanted = True # clicked on Hint button
                 else:
                     # check if a palette button was clicked
                     paletteClicked = getColorOfPaletteAt(mousex, mousey)
+            elif event.type == KEYUP and event.key == K_h and viewport is None:
+                hintWanted = True
+            elif viewport is not None:
+                handleViewportEvent(event, mainBoard.shape)
+
+        if hintWanted:
+            # show which color the solver would pick next (as soon as the
+            # hint process has it, without waiting for it here)
+            hintColor = getCachedHint(mainBoard) if BACKGROUNDHINTS else getHint(mainBoard)
+            hintWanted = hintColor is None and BACKGROUNDHINTS
+
+        if viewport is not None:
+            # scroll the viewport while the arrow keys are held down
+            keys = pygame.key.get_pressed()
+            panViewport(viewport, (keys[K_RIGHT] - keys[K_LEFT]) * PANSPEED,
+                        (keys[K_DOWN] - keys[K_UP]) * PANSPEED, mainBoard.shape)
 
         if paletteClicked != None and paletteClicked != lastPaletteClicked:
             # a palette button was clicked that is different from the
             # last palette button clicked (this check prevents the player
             # from accidentally clicking the same palette twice)
             lastPaletteClicked = paletteClicked
-            floodAnimation(mainBoard, paletteClicked)
+            hintColor = None
+            hintWanted = False
+            floodAnimation(mainTracker, paletteClicked)
+            startHints(mainBoard)
             life -= 1
 
             resetGame = False
-            if hasWon(mainBoard):
+            if hasWon(mainTracker):
                 for i in range(4): # flash border 4 times
                     flashBorderAnimation(WHITE, mainBoard)
                 resetGame = True
@@ -135,9 +225,14 @@ def main():
 
         if resetGame:
             # start a new game
-            mainBoard = generateRandomBoard(boardWidth, boardHeight, difficulty)
+            mainBoard = generateNewGame()
+            mainTracker = getGameTracker(mainBoard)
             life = maxLife
             lastPaletteClicked = None
+            hintColor = None
+            hintWanted = False
+            hintCache.clear() # no board of the old game comes up again
+            startHints(mainBoard)
 
         pygame.display.update()
         FPSCLOCK.tick(FPS)
@@ -146,26 +241,45 @@ def main():
 def checkForQuit():
     # Terminates the program if there are any QUIT or escape key events.
     for event in pygame.event.get(QUIT): # get all the QUIT events
+        stopHints()
         pygame.quit() # terminate if any QUIT events are present
         sys.exit()
     for event in pygame.event.get(KEYUP): # get all the KEYUP events
         if event.key == K_ESCAPE:
+            stopHints()
             pygame.quit() # terminate if the KEYUP event was for the Esc key
             sys.exit()
         pygame.event.post(event) # put the other KEYUP event objects back
 
 
-def hasWon(board):
-    # if the entire board is the same color, player has won
-    for x in range(boardWidth):
-        for y in range(boardHeight):
-            if board[x][y] != board[0][0]:
-                return False # found a different color, player has not won
-    return True
+def handleViewportEvent(event, boardShape):
+    # Scrolls the viewport for mouse drags, and zooms it for the mouse wheel
+    # (around the mouse) and the + and - keys (around the middle).
+    rect = viewport['rect']
+    if event.type == MOUSEMOTION and event.buttons[0] and rect.collidepoint(event.pos):
+        panViewport(viewport, -event.rel[0], -event.rel[1], boardShape)
+    elif event.type == MOUSEWHEEL:
+        mousex, mousey = pygame.mouse.get_pos()
+        if rect.collidepoint(mousex, mousey):
+            zoomViewport(viewport, event.y, mousex - rect.left, mousey - rect.top, boardShape)
+    elif event.type == KEYUP and event.key in (K_PLUS, K_EQUALS, K_KP_PLUS, K_MINUS, K_KP_MINUS):
+        steps = -1 if event.key in (K_MINUS, K_KP_MINUS) else 1
+        zoomViewport(viewport, steps, rect.width // 2, rect.height // 2, boardShape)
+
+
+def hasWon(tracker):
+    # if the flooded area covers the entire board, player has won
+    return tracker['count'] == tracker['total']
+
+
+def isOneColor(board):
+    # Returns True if the entire board is the same color. Checks every box;
+    # hasWon() is the quick check for the game's board.
+    return bool((board == board[0, 0]).all())
 
 
 def showSettingsScreen():
-    global difficulty, boxSize, boardWidth, boardHeight, maxLife, paletteColors, bgColor
+    global difficulty, boxSize, boardWidth, boardHeight, paletteColors, bgColor
 
     # The pixel coordinates in this function were obtained by loading
     # the inkspillsettings.png image into a graphics editor and reading
@@ -173,6 +287,7 @@ def showSettingsScreen():
 
     origDifficulty = difficulty
     origBoxSize = boxSize
+    origBoardWidth = boardWidth
     screenNeedsRedraw = True
 
     while True:
@@ -204,12 +319,13 @@ def showSettingsScreen():
         screenNeedsRedraw = False # by default, don't redraw the screen
         for event in pygame.event.get(): # event handling loop
             if event.type == QUIT:
+                stopHints()
                 pygame.quit()
                 sys.exit()
             elif event.type == KEYUP:
                 if event.key == K_ESCAPE:
                     # Esc key on settings screen goes back to game
-                    return not (origDifficulty == difficulty and origBoxSize == boxSize)
+                    return not (origDifficulty == difficulty and origBoxSize == boxSize and origBoardWidth == boardWidth)
             elif event.type == MOUSEBUTTONUP:
                 screenNeedsRedraw = True # screen should be redrawn
                 mousex, mousey = event.pos # syntactic sugar
@@ -228,25 +344,22 @@ def showSettingsScreen():
                     boxSize = SMALLBOXSIZE
                     boardWidth = SMALLBOARDSIZE
                     boardHeight = SMALLBOARDSIZE
-                    maxLife = SMALLMAXLIFE
                 elif pygame.Rect(52, 192, 106,32).collidepoint(mousex, mousey):
                     # medium board size setting:
                     boxSize = MEDIUMBOXSIZE
                     boardWidth = MEDIUMBOARDSIZE
                     boardHeight = MEDIUMBOARDSIZE
-                    maxLife = MEDIUMMAXLIFE
                 elif pygame.Rect(67, 228, 58, 37).collidepoint(mousex, mousey):
                     # large board size setting:
                     boxSize = LARGEBOXSIZE
                     boardWidth = LARGEBOARDSIZE
                     boardHeight = LARGEBOARDSIZE
-                    maxLife = LARGEMAXLIFE
                 elif pygame.Rect(14, 299, 371, 97).collidepoint(mousex, mousey):
                     # clicked on the "learn programming" ad
                     webbrowser.open('http://inventwithpython.com') # opens a web browser
                 elif pygame.Rect(178, 418, 215, 34).collidepoint(mousex, mousey):
                     # clicked on the "back to game" button
-                    return not (origDifficulty == difficulty and origBoxSize == boxSize)
+                    return not (origDifficulty == difficulty and origBoxSize == boxSize and origBoardWidth == boardWidth)
 
                 for i in range(len(COLORSCHEMES)):
                     # clicked on a color scheme button
@@ -266,111 +379,586 @@ def drawColorSchemeBoxes(x, y, schemeNum):
 
 
 def flashBorderAnimation(color, board, animationSpeed=30):
+    # The board isn't redrawn for every step: the flash is only blended in
+    # around it, from a window-sized surface of color that is made once for
+    # every color and kept in flashOverlays.
     origSurf = DISPLAYSURF.copy()
-    flashSurf = pygame.Surface(DISPLAYSURF.get_size())
-    flashSurf = flashSurf.convert_alpha()
+    flashSurf = getFlashOverlay(color)
+    flashRects = getRectsAroundBoard(board.shape)
     for start, end, step in ((0, 256, 1), (255, 0, -1)):
         # the first iteration on the outer loop will set the inner loop
         # to have transparency go from 0 to 255, the second iteration will
         # have it go from 255 to 0. This is the "flash".
         for transparency in range(start, end, animationSpeed * step):
-            DISPLAYSURF.blit(origSurf, (0, 0))
-            r, g, b = color
-            flashSurf.fill((r, g, b, transparency))
-            DISPLAYSURF.blit(flashSurf, (0, 0))
-            drawBoard(board) # draw board ON TOP OF the transparency layer
+            flashSurf.set_alpha(transparency)
+            for rect in flashRects:
+                DISPLAYSURF.blit(origSurf, rect, rect)
+                DISPLAYSURF.blit(flashSurf, rect, rect)
             pygame.display.update()
             FPSCLOCK.tick(FPS)
     DISPLAYSURF.blit(origSurf, (0, 0)) # redraw the original surface
 
 
-def floodAnimation(board, paletteClicked, animationSpeed=25):
-    origBoard = copy.deepcopy(board)
-    floodFill(board, board[0][0], paletteClicked, 0, 0)
+def getFlashOverlay(color):
+    # Returns a window-sized surface of color, made the first time it is
+    # asked for.
+    if color not in flashOverlays:
+        flashSurf = pygame.Surface(DISPLAYSURF.get_size()).convert()
+        flashSurf.fill(color)
+        flashOverlays[color] = flashSurf
+    return flashOverlays[color]
+
+
+def getRectsAroundBoard(boardShape):
+    # Returns the Rects that cover the window except for the board and its
+    # border: the strips above and below it, and left and right of it.
+    boardRect = getBoardRect(boardShape)
+    rects = [pygame.Rect(0, 0, WINDOWWIDTH, boardRect.top),
+             pygame.Rect(0, boardRect.bottom, WINDOWWIDTH, WINDOWHEIGHT - boardRect.bottom),
+             pygame.Rect(0, boardRect.top, boardRect.left, boardRect.height),
+             pygame.Rect(boardRect.right, boardRect.top, WINDOWWIDTH - boardRect.right, boardRect.height)]
+    return [rect for rect in rects if rect.width > 0 and rect.height > 0]
+
+
+def floodAnimation(tracker, paletteClicked, animationSpeed=25):
+    # The new board slowly becomes opaque over the original board. Only the
+    # flooded area changes color, so only its bounding box is drawn: the new
+    # colors are rendered into boardSurf once, and every step blends that
+    # part of boardSurf onto the screen once more. Every step's alpha is
+    # chosen so the new board has the same weight as if the original board
+    # had been drawn first and the new one over it at transparency.
+    # On a huge board the whole viewport is blended in instead, after its
+    # chunks the flood reached are rendered again.
+    board = tracker['board']
+    if viewport is None:
+        updateBoardSurf(board) # boardSurf shows the original board
+        floodTracked(tracker, paletteClicked)
+        changedRect = renderBoardRegion(board, getBounds(tracker['mask']))
+        changedSurf = boardSurf.subsurface(changedRect)
+        left, top = leftTopPixelCoordOfBox(0, 0)
+        screenRect = changedRect.move(left, top)
+    else:
+        floodTracked(tracker, paletteClicked)
+        markFloodedChunks(viewport, tracker)
+        changedSurf = renderViewport(tracker)
+        screenRect = viewport['rect']
 
+    shown = 0.0 # the weight of the new board on the screen so far
     for transparency in range(0, 255, animationSpeed):
-        # The "new" board slowly become opaque over the original board.
-        drawBoard(origBoard)
-        drawBoard(board, transparency)
-        pygame.display.update()
+        fraction = transparency / 255
+        if fraction > shown:
+            changedSurf.set_alpha(round(255 * (fraction - shown) / (1 - shown)))
+            DISPLAYSURF.blit(changedSurf, screenRect)
+            shown = fraction
+        pygame.display.update(screenRect)
         FPSCLOCK.tick(FPS)
+    changedSurf.set_alpha(None) # leave the new board fully drawn on DISPLAYSURF
+    DISPLAYSURF.blit(changedSurf, screenRect)
 
 
-def generateRandomBoard(width, height, difficulty=MEDIUM):
-    # Creates a board data structure with random colors for each box.
-    board = []
-    for x in range(width):
-        column = []
-        for y in range(height):
-            column.append(random.randint(0, len(paletteColors) - 1))
-        board.append(column)
-
-    # Make board easier by setting some boxes to same color as a neighbor.
-
-    # Determine how many boxes to change.
-    if difficulty == EASY:
-        if boxSize == SMALLBOXSIZE:
-            boxesToChange = 100
-        else:
-            boxesToChange = 1500
-    elif difficulty == MEDIUM:
-        if boxSize == SMALLBOXSIZE:
-            boxesToChange = 5
-        else:
-            boxesToChange = 200
+def generateNewGame():
+    # Returns a new board, and sets maxLife from the number of moves the
+    # solver needs for it (as stored in the board pack, if there is one).
+    global maxLife
+    pack = getBoardPack(boardWidth, boardHeight, difficulty) if USEBOARDPACKS else None
+    if pack:
+        board, solutionLength = readPackedBoard(pack)
     else:
-        boxesToChange = 0
-
-    # Change neighbor's colors:
-    for i in range(boxesToChange):
-        # Randomly choose a box whose color to copy
-        x = random.randint(1, width-2)
-        y = random.randint(1, height-2)
-
-        # Randomly choose neighbors to change.
-        direction = random.randint(0, 3)
-        if direction == 0: # change left and up neighbor
-            board[x-1][y] == board[x][y]
-            board[x][y-1] == board[x][y]
-        elif direction == 1: # change right and down neighbor
-            board[x+1][y] == board[x][y]
-            board[x][y+1] == board[x][y]
-        elif direction == 2: # change right and up neighbor
-            board[x][y-1] == board[x][y]
-            board[x+1][y] == board[x][y]
-        else: # change left and down neighbor
-            board[x][y+1] == board[x][y]
-            board[x-1][y] == board[x][y]
+        board = generateRandomBoard(boardWidth, boardHeight, difficulty)
+        solutionLength = getSolutionLength(board)
+    maxLife = getMaxLife(solutionLength, difficulty)
     return board
 
 
-def drawLogoAndButtons():
-    # draw the Ink Spill logo and Settings and Reset buttons.
+def getMaxLife(solutionLength, difficulty=MEDIUM):
+    return solutionLength + max(MINEXTRALIFE, int(math.ceil(solutionLength * EXTRALIFE[difficulty])))
+
+
+def getHint(board):
+    # Returns the color the solver would flood with next, or None if the
+    # board is already one color.
+    moves = solveBoard(board)['moves']
+    if not moves:
+        return None
+    return moves[0]
+
+
+def startHints(board):
+    # Starts working out the hint for board in the hint process, unless it
+    # is already known: a quick beam search first, so the hint is there
+    # soon, then A* to make it the best one. Whatever the process was doing
+    # for an older board is cancelled: searches that haven't started are
+    # dropped, and the running one gives up when it next checks
+    # hintGeneration. Huge boards get no hints.
+    if not BACKGROUNDHINTS or viewport is not None:
+        return
+    pool = getHintPool()
+    collectHints() # the finished searches may still have useful hints
+    hintGeneration.value += 1
+    for future in hintJobs:
+        future.cancel()
+    del hintJobs[:]
+    color, optimal = hintCache.get(getBoardKey(board), (None, False))
+    if color is None:
+        hintJobs.append(pool.submit(getHintPath, board.copy(), hintGeneration.value, BEAM))
+    if not optimal:
+        hintJobs.append(pool.submit(getHintPath, board.copy(), hintGeneration.value, ASTAR))
+
+
+def getCachedHint(board):
+    # Returns the hint for board if the hint process has found it, or None.
+    # Never waits for the process, so it can be asked every frame.
+    collectHints()
+    return hintCache.get(getBoardKey(board), (None, False))[0]
+
+
+def collectHints():
+    # Moves the hints of the finished searches into hintCache. A shortest
+    # solution's hints replace the beam search's.
+    for future in [future for future in hintJobs if future.done()]:
+        hintJobs.remove(future)
+        if future.cancelled() or future.exception() is not None:
+            continue
+        optimal, path = future.result()
+        for key, color in path:
+            if optimal or key not in hintCache:
+                hintCache[key] = (color, optimal)
+
+
+def stopHints():
+    # Stops the hint process, for when the game quits. A running A* search
+    # gives up at once; a beam search is quick to finish.
+    global hintPool
+    if hintPool is not None:
+        hintGeneration.value += 1
+        hintPool.shutdown(wait=True, cancel_futures=True)
+        hintPool = None
+
+
+def getBoardKey(board):
+    # Every board state a game can reach has its own key: the flooded area
+    # is all the boxes connected to the top left one, so the colors are
+    # enough to tell states apart.
+    return board.shape, board.tobytes()
+
+
+def getHintPool():
+    # The process hints are worked out in, so the game keeps its frame rate
+    # while it searches. It runs at a lower priority than the game.
+    global hintPool, hintGeneration
+    if hintPool is None:
+        hintGeneration = multiprocessing.Value('i', 0)
+        hintPool = concurrent.futures.ProcessPoolExecutor(max_workers=1, initializer=initHintProcess,
+                                                          initargs=(hintGeneration,))
+    return hintPool
+
+
+def initHintProcess(generation):
+    # Runs in the hint process when it starts.
+    global hintGeneration
+    hintGeneration = generation
+    if hasattr(os, 'nice'):
+        os.nice(HINTNICENESS)
+
+
+def getHintPath(board, generation, strategy):
+    # Runs in the hint process. Solves board with the beam search or A*
+    # (which gives up as soon as the game has moved on from board, or when
+    # it runs out of nodes or time). Returns whether the solution is the
+    # shortest, and a list of (board key, hint) for board and every board
+    # on the way to solving it, so following the hints gets the next one at
+    # once. The list is empty if the search gave up.
+    def cancelled():
+        return hintGeneration.value != generation
+
+    if cancelled():
+        return False, []
+    problem = getSolverProblem(getRegionGraph(board))
+    if strategy == ASTAR:
+        moves, nodes = solveAStar(problem, SOLVERNODES, time.perf_counter() + SOLVERTIME / 1000, cancelled)
+    else:
+        moves, nodes = solveBeam(problem, BEAMWIDTH)
+    path = []
+    for color in moves or []:
+        path.append((getBoardKey(board), color))
+        floodFill(board, board[0, 0], color, 0, 0)
+    return strategy == ASTAR, path
+
+
+def generateRandomBoard(width, height, difficulty=MEDIUM, seed=None):
+    # Creates a board data structure with random colors for each box: a
+    # width x height NumPy array of int8 palette indexes, so board[x, y] (or
+    # board[x][y]) is the color of the box at x, y. The same seed always
+    # makes the same board.
+    return generateRandomBoards(1, width, height, difficulty, numpy.random.default_rng(seed))[0]
+
+
+def generateRandomBoards(count, width, height, difficulty=MEDIUM, rng=None):
+    # Returns count random boards at once, as a count x width x height array.
+    # rng is a numpy.random.Generator (a new unseeded one if None).
+    if rng is None:
+        rng = numpy.random.default_rng()
+    boards = rng.integers(0, len(paletteColors), size=(count, width, height), dtype=numpy.int8)
+
+    # Make boards easier by setting some boxes to same color as a neighbor.
+    boxesToChange = getBoxesToChange(width, height, difficulty)
+    if boxesToChange == 0 or width < 3 or height < 3:
+        return boards
+
+    # Randomly choose a box whose color to copy and neighbors to change, for
+    # every change on every board. The changes are made one after another (a
+    # box can copy a color an earlier change gave it), but on all the boards
+    # at once. The choices are drawn for a few changes at a time, so a big
+    # batch of boards doesn't need them all in memory.
+    boxes = boards.reshape(-1) # every box of every board, by box index
+    boardStarts = numpy.arange(count) * (width * height)
+    firstOffsets = SMOOTHINGNEIGHBORS[0] * height + SMOOTHINGNEIGHBORS[1]
+    secondOffsets = SMOOTHINGNEIGHBORS[2] * height + SMOOTHINGNEIGHBORS[3]
+    changesAtOnce = max(1, SMOOTHINGCHOICES // count)
+    for first in range(0, boxesToChange, changesAtOnce):
+        changes = min(changesAtOnce, boxesToChange - first)
+        xs = rng.integers(1, width - 1, size=(changes, count))
+        ys = rng.integers(1, height - 1, size=(changes, count))
+        directions = rng.integers(0, 4, size=(changes, count))
+        copied = boardStarts + xs * height + ys
+        firstNeighbors = copied + firstOffsets[directions]
+        secondNeighbors = copied + secondOffsets[directions]
+        for i in range(changes):
+            colors = boxes[copied[i]]
+            boxes[firstNeighbors[i]] = colors
+            boxes[secondNeighbors[i]] = colors
+    return boards
+
+
+def getBoxesToChange(width, height, difficulty):
+    # Returns how many boxes generateRandomBoards() copies to their
+    # neighbors. Small boards (the size of the small setting or less) need
+    # far fewer changes to get easier.
+    small = width * height <= SMALLBOARDSIZE * SMALLBOARDSIZE
+    if difficulty == EASY:
+        return 100 if small else 1500
+    elif difficulty == MEDIUM:
+        return 5 if small else 200
+    return 0
+
+
+def getBoardPack(width, height, difficulty):
+    # Returns the open board pack for this size and difficulty, or None if
+    # there isn't one (then new boards are generated and solved on the spot).
+    key = (width, height, difficulty)
+    if key not in boardPacks:
+        boardPacks[key] = openBoardPack(BOARDPACKFILE % (width, height, DIFFICULTYNAMES[difficulty]),
+                                        width, height, difficulty) or False
+    return boardPacks[key] or None
+
+
+def getBoardPackRecordSize(width, height):
+    # A record is the solution length (two bytes) and then the colors, two
+    # boxes to a byte.
+    return 2 + (width * height + 1) // 2
+
+
+def packBoards(boards, solutionLengths):
+    # Returns the records of a board pack for a count x width x height
+    # array of boards and the solver's number of moves for each, as bytes.
+    count, width, height = boards.shape
+    colors = numpy.zeros((count, 2 * ((width * height + 1) // 2)), dtype=numpy.uint8)
+    colors[:, :width * height] = boards.reshape(count, width * height)
+    records = numpy.empty((count, getBoardPackRecordSize(width, height)), dtype=numpy.uint8)
+    records[:, :2] = numpy.asarray(solutionLengths, dtype='<u2').view(numpy.uint8).reshape(count, 2)
+    records[:, 2:] = colors[:, 0::2] | (colors[:, 1::2] << 4)
+    return records.tobytes()
+
+
+def openBoardPack(filename, width, height, difficulty):
+    # Maps a file made by inkspillgen.py into memory. Returns None if the
+    # file doesn't exist, or was made for another size or difficulty.
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'rb') as fileObj:
+        data = mmap.mmap(fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, packWidth, packHeight, numColors, packDifficulty, records, seed = BOARDPACKHEADER.unpack_from(data)
+    if (magic != BOARDPACKMAGIC or (packWidth, packHeight, packDifficulty) != (width, height, difficulty)
+            or numColors != len(paletteColors) or records == 0):
+        data.close()
+        return None
+    # Start somewhere different every time the game runs, so it doesn't
+    # deal the same boards in the same order.
+    return {'data': data, 'width': width, 'height': height, 'records': records,
+            'recordSize': getBoardPackRecordSize(width, height), 'next': random.randrange(records)}
+
+
+def readPackedBoard(pack):
+    # Returns the next board of the pack and the solver's number of moves
+    # for it, going back to the first record after the last.
+    width, height = pack['width'], pack['height']
+    offset = BOARDPACKHEADER.size + pack['next'] * pack['recordSize']
+    record = numpy.frombuffer(pack['data'], dtype=numpy.uint8, count=pack['recordSize'], offset=offset)
+    pack['next'] = (pack['next'] + 1) % pack['records']
+    colors = numpy.empty(2 * (pack['recordSize'] - 2), dtype=numpy.int8)
+    colors[0::2] = record[2:] & 15
+    colors[1::2] = record[2:] >> 4
+    solutionLength = int(record[0]) | int(record[1]) << 8
+    return colors[:width * height].reshape(width, height), solutionLength
+
+
+def drawLogoAndButtons(hintWanted=False):
+    # draw the Ink Spill logo and Settings, Reset and Hint buttons. The Hint
+    # button shows that it is waiting while hintWanted is True, and isn't
+    # there for huge boards.
     DISPLAYSURF.blit(LOGOIMAGE, (WINDOWWIDTH - LOGOIMAGE.get_width(), 0))
     DISPLAYSURF.blit(SETTINGSBUTTONIMAGE, (WINDOWWIDTH - SETTINGSBUTTONIMAGE.get_width(), WINDOWHEIGHT - SETTINGSBUTTONIMAGE.get_height()))
     DISPLAYSURF.blit(RESETBUTTONIMAGE, (WINDOWWIDTH - RESETBUTTONIMAGE.get_width(), WINDOWHEIGHT - SETTINGSBUTTONIMAGE.get_height() - RESETBUTTONIMAGE.get_height()))
+    if viewport is None:
+        DISPLAYSURF.blit(HINTWAITINGBUTTONIMAGE if hintWanted else HINTBUTTONIMAGE, getHintButtonRect())
+
+
+def getHintButtonRect():
+    # The Hint button goes above the Reset button.
+    width, height = HINTBUTTONIMAGE.get_size()
+    return pygame.Rect(WINDOWWIDTH - width,
+                       WINDOWHEIGHT - SETTINGSBUTTONIMAGE.get_height() - RESETBUTTONIMAGE.get_height() - height,
+                       width, height)
+
+
+def makeButtonImage(text, size):
+    # Returns a button of the given size with text on it, for the buttons
+    # that have no image file.
+    buttonSurf = pygame.Surface(size, pygame.SRCALPHA)
+    pygame.draw.rect(buttonSurf, DARKGRAY, buttonSurf.get_rect(), 0, 6)
+    pygame.draw.rect(buttonSurf, WHITE, buttonSurf.get_rect(), 2, 6)
+    textSurf = pygame.font.Font(None, 30).render(text, True, WHITE)
+    buttonSurf.blit(textSurf, textSurf.get_rect(center=buttonSurf.get_rect().center))
+    return buttonSurf
 
 
 def drawBoard(board, transparency=255):
-    # The colored squares are drawn to a temporary surface which is then
-    # drawn to the DISPLAYSURF surface. This is done so we can draw the
-    # squares with transparency on top of DISPLAYSURF as it currently is.
-    tempSurf = pygame.Surface(DISPLAYSURF.get_size())
-    tempSurf = tempSurf.convert_alpha()
-    tempSurf.fill((0, 0, 0, 0))
-
-    for x in range(boardWidth):
-        for y in range(boardHeight):
-            left, top = leftTopPixelCoordOfBox(x, y)
-            r, g, b = paletteColors[board[x][y]]
-            pygame.draw.rect(tempSurf, (r, g, b, transparency), (left, top, boxSize, boxSize))
+    # Draws boardSurf, which updateBoardSurf() keeps showing the board, onto
+    # DISPLAYSURF with the transparency.
+    updateBoardSurf(board)
+    width, height = board.shape
+    boardSurf.set_alpha(transparency if transparency < 255 else None)
     left, top = leftTopPixelCoordOfBox(0, 0)
-    pygame.draw.rect(tempSurf, BLACK, (left-1, top-1, boxSize * boardWidth + 1, boxSize * boardHeight + 1), 1)
-    DISPLAYSURF.blit(tempSurf, (0, 0))
+    DISPLAYSURF.blit(boardSurf, (left, top))
+    pygame.draw.rect(DISPLAYSURF, BLACK, (left-1, top-1, boxSize * width + 1, boxSize * height + 1), 1)
+
+
+def updateBoardSurf(board):
+    # Makes boardSurf show board. boardSurf is kept between calls along with
+    # a copy of the board it shows, and only the boxes that have changed
+    # since (or all of them, after a new board size, box size or color
+    # scheme) are rendered again.
+    global boardSurf, boardSurfBoard, boardSurfKey
+    width, height = board.shape
+    key = (width, height, boxSize, paletteColors)
+    if boardSurfKey != key:
+        boardSurf = pygame.Surface((width * boxSize, height * boxSize)).convert()
+        boardSurfBoard = board.copy()
+        boardSurfKey = key
+        renderBoardRegion(board, (0, 0, width, height))
+        return
+    changed = board != boardSurfBoard
+    if changed.any():
+        renderBoardRegion(board, getBounds(changed))
+
+
+def renderBoardRegion(board, bounds):
+    # Renders the boxes from (left, top) up to (right, bottom) of board into
+    # boardSurf, and returns the Rect of boardSurf they cover. The color
+    # indexes are turned into pixels in one step: looking them up in the
+    # palette (already in the surface's pixel format) gives every box its
+    # color, and repeating every box boxSize times across and down gives
+    # the whole picture.
+    left, top, right, bottom = bounds
+    palette = numpy.array([boardSurf.map_rgb(color) for color in paletteColors], dtype=numpy.uint32)
+    pixels = palette[board[left:right, top:bottom]]
+    if boxSize > 1:
+        pixels = pixels.repeat(boxSize, axis=0).repeat(boxSize, axis=1)
+    surfPixels = pygame.surfarray.pixels2d(boardSurf)
+    surfPixels[left * boxSize:right * boxSize, top * boxSize:bottom * boxSize] = pixels
+    del surfPixels # unlocks boardSurf
+    boardSurfBoard[left:right, top:bottom] = board[left:right, top:bottom]
+    return pygame.Rect(left * boxSize, top * boxSize, (right - left) * boxSize, (bottom - top) * boxSize)
+
+
+def getBounds(mask):
+    # Returns (left, top, right, bottom), the smallest part of the board
+    # that holds every True box of mask (right and bottom not included).
+    xs = numpy.flatnonzero(mask.any(axis=1))
+    ys = numpy.flatnonzero(mask.any(axis=0))
+    return int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1
+
+
+def isHugeBoard():
+    # Boards bigger than the large setting don't fit the window; they are
+    # played in a viewport that can be scrolled and zoomed.
+    return boardWidth > LARGEBOARDSIZE or boardHeight > LARGEBOARDSIZE
+
+
+def getGameTracker(board):
+    # Returns the flood tracker for a new game's board, and sets up the
+    # viewport if the board is a huge one (or takes it down if it isn't).
+    # Huge boards aren't recolored after every move, and are drawn from
+    # the tracker instead.
+    global viewport
+    tracker = getFloodTracker(board, recolor=not isHugeBoard())
+    viewport = getViewport(tracker) if isHugeBoard() else None
+    return tracker
+
+
+def getViewport(tracker):
+    # Returns a dict of what is needed to draw part of a huge board:
+    #   'rect'     - where on the screen the viewport is, where the large
+    #                board would be
+    #   'zoom'     - the index of the box size in ZOOMLEVELS
+    #   'left', 'top' - the pixel of the board (at that box size) at the
+    #                viewport's top left corner
+    #   'chunks'   - an OrderedDict of (chunk x, chunk y) to the chunk's
+    #                rendered surface, least recently used first, holding
+    #                'chunkBytes' bytes of pixels
+    #   'floodedChunks' - a boolean array with a True for every chunk that
+    #                has flooded boxes in it
+    #   'surf'     - a viewport-sized surface the chunks are put together on
+    #   'rendered' - how many chunks have been rendered, for inkspillbench.py
+    # The board is split into chunks of CHUNKSIZE x CHUNKSIZE boxes.
+    width, height = tracker['board'].shape
+    rect = pygame.Rect(int((WINDOWWIDTH - VIEWPORTSIZE) / 2), int((WINDOWHEIGHT - VIEWPORTSIZE) / 2),
+                       VIEWPORTSIZE, VIEWPORTSIZE)
+    viewport = {'rect': rect, 'zoom': ZOOMLEVELS.index(LARGEBOXSIZE), 'left': 0, 'top': 0,
+                'chunks': collections.OrderedDict(), 'chunkBytes': 0,
+                'floodedChunks': numpy.zeros((-(-width // CHUNKSIZE), -(-height // CHUNKSIZE)), dtype=bool),
+                'surf': pygame.Surface(rect.size).convert(), 'rendered': 0}
+    markFloodedChunks(viewport, tracker)
+    return viewport
+
+
+def panViewport(viewport, dx, dy, boardShape):
+    # Scrolls the viewport by dx, dy pixels, but not past the board's edges.
+    width, height = boardShape
+    size = ZOOMLEVELS[viewport['zoom']]
+    viewport['left'] = max(0, min(viewport['left'] + dx, width * size - VIEWPORTSIZE))
+    viewport['top'] = max(0, min(viewport['top'] + dy, height * size - VIEWPORTSIZE))
+
+
+def zoomViewport(viewport, steps, x, y, boardShape):
+    # Zooms in (or out, for negative steps) through ZOOMLEVELS, keeping the
+    # box at x, y (pixels from the viewport's top left) where it is.
+    zoom = max(0, min(viewport['zoom'] + steps, len(ZOOMLEVELS) - 1))
+    if zoom == viewport['zoom']:
+        return
+    oldSize, newSize = ZOOMLEVELS[viewport['zoom']], ZOOMLEVELS[zoom]
+    viewport['zoom'] = zoom
+    viewport['left'] = int((viewport['left'] + x) * newSize / oldSize) - x
+    viewport['top'] = int((viewport['top'] + y) * newSize / oldSize) - y
+    panViewport(viewport, 0, 0, boardShape)
+    viewport['chunks'].clear() # rendered for the old box size
+    viewport['chunkBytes'] = 0
+
+
+def markFloodedChunks(viewport, tracker):
+    # Marks the chunks the last flood reached. The whole flooded area changes
+    # color with every flood, so the rendered chunks with flooded boxes in
+    # them are all thrown away, and rendered again when next drawn.
+    gained = numpy.array(tracker['gained'], dtype=numpy.int64)
+    height = tracker['height']
+    floodedChunks = viewport['floodedChunks']
+    floodedChunks[gained // height // CHUNKSIZE, gained % height // CHUNKSIZE] = True
+    chunks = viewport['chunks']
+    for key in [key for key in chunks if floodedChunks[key]]:
+        viewport['chunkBytes'] -= getSurfaceBytes(chunks.pop(key))
+
+
+def getChunk(tracker, viewport, chunkx, chunky):
+    # Returns the rendered surface of a chunk, rendering it if it isn't
+    # cached. The least recently used chunks are dropped to keep the cache
+    # under CHUNKCACHEBYTES.
+    chunks = viewport['chunks']
+    key = (chunkx, chunky)
+    if key in chunks:
+        chunks.move_to_end(key)
+        return chunks[key]
+    chunkSurf = renderChunk(tracker, viewport, chunkx, chunky)
+    chunks[key] = chunkSurf
+    viewport['chunkBytes'] += getSurfaceBytes(chunkSurf)
+    viewport['rendered'] += 1
+    while viewport['chunkBytes'] > CHUNKCACHEBYTES and len(chunks) > 1:
+        viewport['chunkBytes'] -= getSurfaceBytes(chunks.popitem(last=False)[1])
+    return chunkSurf
+
+
+def getSurfaceBytes(surf):
+    return surf.get_width() * surf.get_height() * surf.get_bytesize()
+
+
+def renderChunk(tracker, viewport, chunkx, chunky):
+    # Returns a new surface of one chunk of the tracked board at the
+    # viewport's box size, the same way renderBoardRegion() renders.
+    size = ZOOMLEVELS[viewport['zoom']]
+    left, top = chunkx * CHUNKSIZE, chunky * CHUNKSIZE
+    board = tracker['board'][left:left + CHUNKSIZE, top:top + CHUNKSIZE]
+    mask = tracker['mask'][left:left + CHUNKSIZE, top:top + CHUNKSIZE]
+    chunkSurf = pygame.Surface((board.shape[0] * size, board.shape[1] * size)).convert()
+    if mask.all():
+        chunkSurf.fill(paletteColors[tracker['color']])
+        return chunkSurf
+    palette = numpy.array([chunkSurf.map_rgb(color) for color in paletteColors], dtype=numpy.uint32)
+    pixels = palette[board]
+    pixels[mask] = palette[tracker['color']]
+    if size > 1:
+        pixels = pixels.repeat(size, axis=0).repeat(size, axis=1)
+    pygame.surfarray.blit_array(chunkSurf, pixels)
+    return chunkSurf
+
+
+def renderViewport(tracker):
+    # Puts the chunks the viewport shows together on its surface, and
+    # returns the surface.
+    viewportSurf = viewport['surf']
+    viewportSurf.fill(bgColor)
+    chunkPixels = CHUNKSIZE * ZOOMLEVELS[viewport['zoom']]
+    chunksAcross, chunksDown = viewport['floodedChunks'].shape
+    for chunkx in range(viewport['left'] // chunkPixels,
+                        min(chunksAcross, (viewport['left'] + VIEWPORTSIZE - 1) // chunkPixels + 1)):
+        for chunky in range(viewport['top'] // chunkPixels,
+                            min(chunksDown, (viewport['top'] + VIEWPORTSIZE - 1) // chunkPixels + 1)):
+            viewportSurf.blit(getChunk(tracker, viewport, chunkx, chunky),
+                              (chunkx * chunkPixels - viewport['left'], chunky * chunkPixels - viewport['top']))
+    return viewportSurf
+
+
+def drawViewport(tracker):
+    # Draws the part of a huge board the viewport shows, and its border.
+    DISPLAYSURF.blit(renderViewport(tracker), viewport['rect'])
+    pygame.draw.rect(DISPLAYSURF, BLACK, getBoardRect(tracker['board'].shape), 1)
+
+
+def getBoardRect(boardShape):
+    # Returns the Rect of the board's black border (the viewport's, for a
+    # huge board).
+    if viewport is not None:
+        rect = viewport['rect']
+        return pygame.Rect(rect.left - 1, rect.top - 1, rect.width + 1, rect.height + 1)
+    width, height = boardShape
+    left, top = leftTopPixelCoordOfBox(0, 0)
+    return pygame.Rect(left - 1, top - 1, width * boxSize + 1, height * boxSize + 1)
+
 
+def getSolutionLength(board):
+    # Returns the number of moves the solver needs for board. Boards too big
+    # to solve quickly have their top left corner of HUGESAMPLESIZE boxes
+    # across solved instead, and the length scaled up to the whole board
+    # (the moves needed grow about as fast as the board's sides).
+    width, height = board.shape
+    if width <= HUGESAMPLESIZE and height <= HUGESAMPLESIZE:
+        return len(solveBoard(board)['moves'])
+    sample = board[:HUGESAMPLESIZE, :HUGESAMPLESIZE]
+    sampleLength = len(solveBoard(sample)['moves'])
+    return int(math.ceil(sampleLength * (width + height) / float(sum(sample.shape))))
 
-def drawPalettes():
-    # Draws the six color palettes at the bottom of the screen.
+
+def drawPalettes(hintColor=None):
+    # Draws the six color palettes at the bottom of the screen, with a white
+    # outline around the hintColor palette.
     numColors = len(paletteColors)
     xmargin = int((WINDOWWIDTH - ((PALETTESIZE * numColors) + (PALETTEGAPSIZE * (numColors - 1)))) / 2)
     for i in range(numColors):
@@ -378,10 +966,21 @@ def drawPalettes():
         top = WINDOWHEIGHT - PALETTESIZE - 10
         pygame.draw.rect(DISPLAYSURF, paletteColors[i], (left, top, PALETTESIZE, PALETTESIZE))
         pygame.draw.rect(DISPLAYSURF, bgColor,   (left + 2, top + 2, PALETTESIZE - 4, PALETTESIZE - 4), 2)
+        if i == hintColor:
+            pygame.draw.rect(DISPLAYSURF, WHITE, (left - 4, top - 4, PALETTESIZE + 8, PALETTESIZE + 8), 3)
 
 
 def drawLifeMeter(currentLife):
     lifeBoxSize = int((WINDOWHEIGHT - 40) / maxLife)
+    if lifeBoxSize < 2:
+        # too much life for a box each (on a huge board): draw one bar
+        # that empties from the top
+        meterHeight = WINDOWHEIGHT - 40
+        lifeHeight = int(meterHeight * currentLife / maxLife)
+        pygame.draw.rect(DISPLAYSURF, bgColor, (20, 20, 20, meterHeight))
+        pygame.draw.rect(DISPLAYSURF, RED, (20, 20 + meterHeight - lifeHeight, 20, lifeHeight))
+        pygame.draw.rect(DISPLAYSURF, WHITE, (20, 20, 20, meterHeight), 1)
+        return
 
     # Draw background color of life meter.
     pygame.draw.rect(DISPLAYSURF, bgColor, (20, 20, 20, 20 + (maxLife * lifeBoxSize)))
@@ -408,29 +1007,331 @@ def getColorOfPaletteAt(x, y):
 
 
 def floodFill(board, oldColor, newColor, x, y):
-    # This is the flood fill algorithm.
-    if oldColor == newColor or board[x][y] != oldColor:
+    # This is the flood fill algorithm: every box of oldColor connected to
+    # the box at x, y becomes newColor.
+    if oldColor == newColor or board[x, y] != oldColor:
         return
-
-    board[x][y] = newColor # change the color of the current box
-
-    # Make the recursive call for any neighboring boxes:
-    if x > 0:
-        floodFill(board, oldColor, newColor, x - 1, y) # on box to the left
-    if x < boardWidth - 1:
-        floodFill(board, oldColor, newColor, x + 1, y) # on box to the right
-    if y > 0:
-        floodFill(board, oldColor, newColor, x, y - 1) # on box to up
-    if y < boardHeight - 1:
-        floodFill(board, oldColor, newColor, x, y + 1) # on box to down
+    board[getConnectedMask(board, x, y)] = newColor
+
+
+def getFloodTracker(board, recolor=True):
+    # Returns a dict that keeps track of the flooded area (the boxes
+    # connected to the top left box) of board as the game floods it:
+    #   'board'    - the board, which floodTracked() keeps recolored (unless
+    #                recolor is False; then the flooded boxes keep their
+    #                first colors there, and 'color' is their color)
+    #   'flooded'  - a bytearray with a 1 for every flooded box, indexed
+    #                by x * height + y; 'mask' is the same memory as a
+    #                width x height boolean array
+    #   'count', 'total' - how many boxes are flooded, and on the board
+    #   'color'    - the flooded area's color
+    #   'frontier' - for every color, the set of boxes of that color next
+    #                to the flooded area
+    #   'gained'   - a list of the boxes the last flood added
+    # Boxes that aren't flooded never change color, so their colors are
+    # read from a bytes copy of the board made here, which is quicker to
+    # index than the array.
+    width, height = board.shape
+    flooded = bytearray(width * height)
+    tracker = {'board': board, 'colors': board.astype(numpy.int8).tobytes(), 'height': height,
+               'flooded': flooded,
+               'mask': numpy.frombuffer(flooded, dtype=bool).reshape(width, height),
+               'count': 1, 'total': width * height, 'color': int(board[0, 0]),
+               'frontier': dict((color, set()) for color in range(len(paletteColors))),
+               'gained': [0], 'recolor': recolor}
+    flooded[0] = 1
+    tracker['count'] += absorbBoxes(tracker, tracker['gained'])
+    return tracker
+
+
+def floodTracked(tracker, newColor):
+    # Floods the tracked board with newColor. Only the frontier boxes of
+    # newColor (and the boxes of newColor connected to them) are visited.
+    # Returns the number of boxes the flooded area gained.
+    if newColor == tracker['color']:
+        tracker['gained'] = []
+        return 0
+    tracker['color'] = newColor
+    boxes = list(tracker['frontier'][newColor])
+    tracker['frontier'][newColor] = set()
+    flooded = tracker['flooded']
+    for box in boxes:
+        flooded[box] = 1
+    absorbBoxes(tracker, boxes)
+    tracker['gained'] = boxes
+    tracker['count'] += len(boxes)
+    if tracker['recolor']:
+        # Recoloring goes over the whole board; huge boards skip it.
+        tracker['board'][tracker['mask']] = newColor
+    return len(boxes)
+
+
+def absorbBoxes(tracker, boxes):
+    # Walks out from the newly flooded boxes in the list boxes. Neighbors of
+    # the flooded color are flooded too (added to boxes, and walked from),
+    # and the others are added to the frontier. Returns the number of boxes
+    # flooded here.
+    colors = tracker['colors']
+    flooded = tracker['flooded']
+    frontier = tracker['frontier']
+    color = tracker['color']
+    height = tracker['height']
+    total = tracker['total']
+    first = len(boxes)
+    i = 0
+    while i < len(boxes):
+        box = boxes[i]
+        i += 1
+        y = box % height
+        for neighbor in (box - height, box + height,
+                         box - 1 if y > 0 else -1, box + 1 if y < height - 1 else -1):
+            if neighbor < 0 or neighbor >= total or flooded[neighbor]:
+                continue
+            if colors[neighbor] == color:
+                flooded[neighbor] = 1
+                boxes.append(neighbor)
+            else:
+                frontier[colors[neighbor]].add(neighbor)
+    return len(boxes) - first
+
+
+def getConnectedMask(board, x, y):
+    # Returns a boolean array of the boxes connected to the box at x, y by
+    # boxes of its color. The mask starts as just that box and grows by one
+    # box in every direction at a time (staying on its color) until it stops
+    # growing, so each step is a few whole-array operations instead of a
+    # function call per box. The steps only look at the rectangle around
+    # the mask so far, so small regions on big boards stay cheap.
+    width, height = board.shape
+    color = board[x, y]
+    mask = numpy.zeros(board.shape, dtype=bool)
+    mask[x, y] = True
+    left, right, top, bottom = x, x, y, y # the mask's bounding box (inclusive)
+    count = 1
+    while True:
+        left, right = max(0, left - 1), min(width - 1, right + 1)
+        top, bottom = max(0, top - 1), min(height - 1, bottom + 1)
+        window = mask[left:right + 1, top:bottom + 1]
+        grown = window.copy()
+        grown[1:, :] |= window[:-1, :]
+        grown[:-1, :] |= window[1:, :]
+        grown[:, 1:] |= window[:, :-1]
+        grown[:, :-1] |= window[:, 1:]
+        grown &= board[left:right + 1, top:bottom + 1] == color
+        newCount = numpy.count_nonzero(grown)
+        if newCount == count:
+            return mask
+        count = newCount
+        window[...] = grown
+        columns = numpy.flatnonzero(grown.any(axis=1))
+        rows = numpy.flatnonzero(grown.any(axis=0))
+        left, right = left + columns[0], left + columns[-1]
+        top, bottom = top + rows[0], top + rows[-1]
+
+
+def getRegionGraph(board):
+    # Collapses the board into regions (groups of connected boxes of the
+    # same color) for the solver and returns a dict describing them:
+    #   'cellRegion' - the region of every box, indexed by x * height + y
+    #   'color', 'size' - the color and number of boxes of every region
+    #   'neighbors'  - the set of regions next to every region
+    #   'flooded'    - the region holding the top left box
+    #   'regions'    - how many regions there are
+    board = numpy.asarray(board).tolist() # lists are faster to walk box by box
+    width = len(board)
+    height = len(board[0])
+    cellRegion = [None] * (width * height)
+    colors = []
+    sizes = []
+    for x in range(width):
+        for y in range(height):
+            if cellRegion[x * height + y] is not None:
+                continue
+            # Give every box connected to this one the next region number.
+            region = len(colors)
+            color = board[x][y]
+            cellRegion[x * height + y] = region
+            stack = [(x, y)]
+            size = 0
+            while stack:
+                boxx, boxy = stack.pop()
+                size += 1
+                for nextx, nexty in ((boxx - 1, boxy), (boxx + 1, boxy), (boxx, boxy - 1), (boxx, boxy + 1)):
+                    if (0 <= nextx < width and 0 <= nexty < height and board[nextx][nexty] == color
+                            and cellRegion[nextx * height + nexty] is None):
+                        cellRegion[nextx * height + nexty] = region
+                        stack.append((nextx, nexty))
+            colors.append(color)
+            sizes.append(size)
+
+    neighbors = [set() for i in range(len(colors))]
+    for x in range(width):
+        for y in range(height):
+            region = cellRegion[x * height + y]
+            if x < width - 1 and cellRegion[(x + 1) * height + y] != region:
+                neighbors[region].add(cellRegion[(x + 1) * height + y])
+                neighbors[cellRegion[(x + 1) * height + y]].add(region)
+            if y < height - 1 and cellRegion[x * height + y + 1] != region:
+                neighbors[region].add(cellRegion[x * height + y + 1])
+                neighbors[cellRegion[x * height + y + 1]].add(region)
+
+    return {'width': width, 'height': height, 'cellRegion': cellRegion, 'color': colors,
+            'size': sizes, 'neighbors': neighbors, 'flooded': cellRegion[0], 'regions': len(colors)}
+
+
+def solveBoard(board, strategy=SOLVERSTRATEGY, nodeLimit=SOLVERNODES, timeLimit=SOLVERTIME):
+    # Returns a dict with the list of colors that floods the whole board
+    # ('moves'), whether that list is known to be the shortest ('optimal'),
+    # the positions looked at ('nodes') and the seconds taken ('time').
+    # A* falls back to the beam search when it runs out of nodes or time.
+    startTime = time.perf_counter()
+    problem = getSolverProblem(getRegionGraph(board))
+    deadline = startTime + timeLimit / 1000
+    if strategy == ASTAR:
+        moves, nodes = solveAStar(problem, nodeLimit, deadline)
+        optimal = moves is not None
+        if moves is None:
+            moves, beamNodes = solveBeam(problem, BEAMWIDTH)
+            nodes += beamNodes
+    elif strategy == BEAM:
+        moves, nodes = solveBeam(problem, BEAMWIDTH)
+        optimal = False
+    else:
+        moves, nodes = solveBeam(problem, 1) # a beam one position wide is the greedy search
+        optimal = False
+    return {'moves': moves, 'optimal': optimal or len(moves) <= 1, 'nodes': nodes,
+            'time': time.perf_counter() - startTime, 'strategy': strategy}
+
+
+def getSolverProblem(graph):
+    # The solver works on bitmasks of regions: bit r stands for region r of
+    # the graph. A position is the mask of the flooded regions plus the
+    # mask of the regions next to it, the frontier, since a move only ever
+    # takes in frontier regions of the color picked.
+    numColors = max(graph['color']) + 1
+    neighborMasks = []
+    for neighbors in graph['neighbors']:
+        mask = 0
+        for region in neighbors:
+            mask |= 1 << region
+        neighborMasks.append(mask)
+    colorMasks = [0] * numColors
+    for region, color in enumerate(graph['color']):
+        colorMasks[color] |= 1 << region
+    flooded = 1 << graph['flooded']
+    return {'neighborMasks': neighborMasks, 'colorMasks': colorMasks, 'sizes': graph['size'],
+            'all': (1 << len(graph['color'])) - 1, 'flooded': flooded,
+            'frontier': neighborMasks[graph['flooded']], 'cells': graph['size'][graph['flooded']]}
+
+
+def getNextPositions(problem, flooded, frontier, cells):
+    # Yields (color, flooded, frontier, cells) for every color that takes
+    # in at least one region.
+    neighborMasks = problem['neighborMasks']
+    sizes = problem['sizes']
+    for color, colorMask in enumerate(problem['colorMasks']):
+        absorbed = frontier & colorMask
+        if not absorbed:
+            continue
+        newFrontier = frontier
+        newCells = cells
+        while absorbed:
+            low = absorbed & -absorbed
+            region = low.bit_length() - 1
+            newFrontier |= neighborMasks[region]
+            newCells += sizes[region]
+            absorbed ^= low
+        newFlooded = flooded | (frontier & colorMask)
+        yield color, newFlooded, newFrontier & ~newFlooded, newCells
+
+
+def getColorsLeft(problem, flooded):
+    # Every color that still has unflooded regions takes at least one more
+    # move, so this never overestimates the moves left (A* needs that).
+    unflooded = problem['all'] & ~flooded
+    return sum(1 for colorMask in problem['colorMasks'] if colorMask & unflooded)
+
+
+def solveBeam(problem, width):
+    # Moves every kept position one color further and keeps the width of
+    # them that flood the most boxes (the fewest colors left breaks ties),
+    # until one floods everything. Returns the moves and the nodes made.
+    positions = [(problem['flooded'], problem['frontier'], problem['cells'], ())]
+    seen = set([problem['flooded']])
+    nodes = 0
+    while positions[0][0] != problem['all']:
+        children = []
+        for flooded, frontier, cells, moves in positions:
+            for color, newFlooded, newFrontier, newCells in getNextPositions(problem, flooded, frontier, cells):
+                nodes += 1
+                if newFlooded in seen:
+                    continue
+                seen.add(newFlooded)
+                children.append((newCells, -getColorsLeft(problem, newFlooded),
+                                 newFlooded, newFrontier, moves + (color,)))
+        children.sort(reverse=True)
+        positions = [(flooded, frontier, cells, moves) for cells, colorsLeft, flooded, frontier, moves
+                     in children[:width]]
+    return list(positions[0][3]), nodes
+
+
+def solveAStar(problem, nodeLimit, deadline, cancelled=None):
+    # Returns the shortest list of moves, or None if the search ran out of
+    # nodes or time (or cancelled, a function, returned True), and the
+    # nodes made. Positions already reached with as few moves are skipped.
+    start = problem['flooded']
+    queue = [(getColorsLeft(problem, start), -problem['cells'], start, problem['frontier'], problem['cells'])]
+    bestMoves = {start: 0}
+    cameFrom = {start: None}
+    nodes = 0
+    nextCheck = 0 # nodes at which to look at the clock (and cancelled) next
+    while queue:
+        estimate, negCells, flooded, frontier, cells = heapq.heappop(queue)
+        if flooded == problem['all']:
+            moves = []
+            while cameFrom[flooded] is not None:
+                flooded, color = cameFrom[flooded]
+                moves.append(color)
+            return moves[::-1], nodes
+        movesSoFar = bestMoves[flooded]
+        if estimate > movesSoFar + getColorsLeft(problem, flooded):
+            continue # a shorter way here was found after this was queued
+        if nodes > nodeLimit:
+            return None, nodes
+        if nodes >= nextCheck:
+            nextCheck = nodes + 1024
+            if time.perf_counter() > deadline or (cancelled is not None and cancelled()):
+                return None, nodes
+        for color, newFlooded, newFrontier, newCells in getNextPositions(problem, flooded, frontier, cells):
+            nodes += 1
+            if bestMoves.get(newFlooded, movesSoFar + 2) <= movesSoFar + 1:
+                continue
+            bestMoves[newFlooded] = movesSoFar + 1
+            cameFrom[newFlooded] = (flooded, color)
+            heapq.heappush(queue, (movesSoFar + 1 + getColorsLeft(problem, newFlooded), -newCells,
+                                   newFlooded, newFrontier, newCells))
+    return None, nodes
 
 
 def leftTopPixelCoordOfBox(boxx, boxy):
     # Returns the x and y of the left-topmost pixel of the xth & yth box.
+    # On a huge board, that is where it is (or would be) in the viewport.
+    if viewport is not None:
+        size = ZOOMLEVELS[viewport['zoom']]
+        return (viewport['rect'].left + boxx * size - viewport['left'],
+                viewport['rect'].top + boxy * size - viewport['top'])
     xmargin = int((WINDOWWIDTH - (boardWidth * boxSize)) / 2)
     ymargin = int((WINDOWHEIGHT - (boardHeight * boxSize)) / 2)
     return (boxx * boxSize + xmargin, boxy * boxSize + ymargin)
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play Ink Spill.')
+    parser.add_argument('--size', type=int,
+                        help='board width and height in boxes, instead of the settings screen\'s; '
+                             'boards bigger than %s are played in a scrollable viewport' % LARGEBOARDSIZE)
+    args = parser.parse_args()
+    if args.size:
+        boardWidth = boardHeight = args.size
+        boxSize = max(1, VIEWPORTSIZE // args.size) # only used if it fits
     main()
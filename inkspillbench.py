@@ -0,0 +1,436 @@
+# Ink Spill benchmarks
+# Measures how the board operations of inkspill.py scale with the board size.
+#
+#   python inkspillbench.py --board                  list board vs NumPy board vs flood tracker
+#   python inkspillbench.py --board --sizes 6 17 30  only the game's own sizes
+#   python inkspillbench.py --render                 drawBoard() frame cost, old vs surfarray
+#   python inkspillbench.py --animation              flood and flash animation step cost, old vs cached
+#   python inkspillbench.py --huge                   move latency and memory of huge boards
+#
+# Set the environment variable SDL_VIDEODRIVER=dummy to run --render,
+# --animation and --huge without a window.
+
+import argparse, os, random, resource, time, concurrent.futures
+import numpy, pygame
+import inkspill
+from inkspill import (SMALLBOARDSIZE, MEDIUMBOARDSIZE, LARGEBOARDSIZE, LARGEBOXSIZE, HARD,
+                      WINDOWWIDTH, WINDOWHEIGHT, FPS, ZOOMLEVELS)
+
+BOARDSIZES = (SMALLBOARDSIZE, MEDIUMBOARDSIZE, LARGEBOARDSIZE, 500, 2000)
+NUMCOLORS = 6
+# Board sizes and box sizes for --render, the game's large board and
+# bigger custom ones that still fit in the window.
+RENDERSIZES = ((LARGEBOARDSIZE, LARGEBOXSIZE), (100, 4), (200, 2), (400, 1))
+HUGESIZES = (100, 250, 500, 1000, 2000, 4000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Ink Spill.')
+    parser.add_argument('--board', action='store_true',
+                        help='time generating, flooding and win checks: lists of lists, '
+                             'NumPy board and flood tracker')
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='board widths (and heights) to try (default: %s)' % ' '.join(map(str, BOARDSIZES)))
+    parser.add_argument('--moves', type=int, default=20,
+                        help='flood moves to time on every board (default: 20)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the boards and moves')
+    parser.add_argument('--render', action='store_true',
+                        help='time drawing the board both ways, as floodAnimation() does')
+    parser.add_argument('--frames', type=int, default=20,
+                        help='frames to draw each way for --render (default: 20)')
+    parser.add_argument('--animation', action='store_true',
+                        help='time floodAnimation() and flashBorderAnimation() steps, '
+                             'redrawing the board every step and from cached surfaces')
+    parser.add_argument('--floods', type=int, default=10,
+                        help='flood animations to time each way for --animation (default: 10)')
+    parser.add_argument('--huge', action='store_true',
+                        help='time moves on huge boards played through the viewport, and '
+                             'measure the memory they take (--sizes to change the sizes, '
+                             'default: %s)' % ' '.join(map(str, HUGESIZES)))
+    parser.add_argument('--zoom', type=int, default=ZOOMLEVELS[0], choices=ZOOMLEVELS,
+                        help='box size in pixels for --huge (default: %s, the most chunks on screen)'
+                             % ZOOMLEVELS[0])
+    args = parser.parse_args()
+
+    if args.board:
+        printBoardResults([measureBoard(size, args.moves, args.seed) for size in args.sizes or BOARDSIZES])
+    if args.render:
+        printRenderResults(measureRendering(args.frames))
+    if args.animation:
+        printAnimationResults(measureAnimation(args.floods))
+    if args.huge:
+        printHugeResults([measureHugeBoardAlone(size, args.moves, args.zoom, args.seed)
+                          for size in args.sizes or HUGESIZES])
+    if not (args.board or args.render or args.animation or args.huge):
+        parser.print_help()
+
+
+def recursiveFloodFill(board, oldColor, newColor, x, y, width, height):
+    # The flood fill inkspill.py used to have, on a list-of-lists board.
+    if oldColor == newColor or board[x][y] != oldColor:
+        return
+    board[x][y] = newColor
+    if x > 0:
+        recursiveFloodFill(board, oldColor, newColor, x - 1, y, width, height)
+    if x < width - 1:
+        recursiveFloodFill(board, oldColor, newColor, x + 1, y, width, height)
+    if y > 0:
+        recursiveFloodFill(board, oldColor, newColor, x, y - 1, width, height)
+    if y < height - 1:
+        recursiveFloodFill(board, oldColor, newColor, x, y + 1, width, height)
+
+
+def listHasWon(board, width, height):
+    # The hasWon() inkspill.py used to have, on a list-of-lists board.
+    for x in range(width):
+        for y in range(height):
+            if board[x][y] != board[0][0]:
+                return False
+    return True
+
+
+def generateListBoard(width, height):
+    # How generateRandomBoard() used to draw the colors, one box at a time.
+    return [[random.randint(0, NUMCOLORS - 1) for y in range(height)] for x in range(width)]
+
+
+def getGreedyColor(board):
+    # Returns the color most boxes next to the flooded area have, so the
+    # flooded area grows about as fast as a player would make it grow.
+    mask = inkspill.getConnectedMask(board, 0, 0)
+    border = numpy.zeros(board.shape, dtype=bool)
+    border[1:, :] |= mask[:-1, :]
+    border[:-1, :] |= mask[1:, :]
+    border[:, 1:] |= mask[:, :-1]
+    border[:, :-1] |= mask[:, 1:]
+    border &= ~mask
+    return int(numpy.bincount(board[border], minlength=NUMCOLORS).argmax())
+
+
+def measureBoard(size, moves, seed):
+    # Returns a dict of the seconds each way takes to generate a size x size
+    # board, to flood it moves times (from the top left, with the color
+    # that grows the flooded area most) and to check it for a win after
+    # every move, plus to check a board that has been won (the slowest case
+    # for the loops). The recursive flood fill is run with Python's normal
+    # recursion limit, and gives up (None) when a flooded area gets too big
+    # for it.
+    random.seed(seed)
+    numpy.random.seed(seed)
+    results = {'size': size}
+
+    startTime = time.perf_counter()
+    listBoard = generateListBoard(size, size)
+    results['listGenerate'] = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    inkspill.generateRandomBoard(size, size, HARD)
+    results['arrayGenerate'] = time.perf_counter() - startTime
+
+    board = numpy.array(listBoard, dtype=numpy.int8) # flood the same board every way
+    tracker = inkspill.getFloodTracker(board.copy())
+    colors = []
+    results['arrayFlood'] = results['arrayWon'] = 0.0
+    results['trackerFlood'] = results['trackerWon'] = 0.0
+    for i in range(moves):
+        color = getGreedyColor(board)
+        colors.append(color)
+        startTime = time.perf_counter()
+        inkspill.floodFill(board, board[0, 0], color, 0, 0)
+        results['arrayFlood'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        inkspill.isOneColor(board)
+        results['arrayWon'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        inkspill.floodTracked(tracker, color)
+        results['trackerFlood'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        inkspill.hasWon(tracker)
+        results['trackerWon'] += time.perf_counter() - startTime
+    assert (tracker['board'] == board).all()
+    results['flooded'] = tracker['count']
+
+    results['listFlood'] = results['listWon'] = 0.0
+    for color in colors:
+        startTime = time.perf_counter()
+        try:
+            recursiveFloodFill(listBoard, listBoard[0][0], color, 0, 0, size, size)
+        except RecursionError:
+            results['listFlood'] = None
+            break
+        results['listFlood'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        listHasWon(listBoard, size, size)
+        results['listWon'] += time.perf_counter() - startTime
+    if results['listFlood'] is not None:
+        assert board.tolist() == listBoard
+    else:
+        results['listWon'] = None
+
+    board[...] = 0
+    startTime = time.perf_counter()
+    inkspill.isOneColor(board)
+    results['arrayWonBoard'] = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    listHasWon(board.tolist(), size, size)
+    results['listWonBoard'] = time.perf_counter() - startTime
+    return results
+
+
+def printBoardResults(results):
+    print('all times in ms; flood and win check are the totals for all the moves')
+    print('     size  flooded  generate: lists    numpy  flood: recursive    numpy  tracker'
+          '  win check: loops   numpy  tracker  won board: loops   numpy')
+    for r in results:
+        print('%9s %8s %16.2f %8.2f %17s %8.2f %8.2f %17s %7.2f %8.3f %17.2f %7.2f' % (
+            '%sx%s' % (r['size'], r['size']), r['flooded'], 1000 * r['listGenerate'],
+            1000 * r['arrayGenerate'], formatMs(r['listFlood']), 1000 * r['arrayFlood'],
+            1000 * r['trackerFlood'], formatMs(r['listWon']), 1000 * r['arrayWon'],
+            1000 * r['trackerWon'], 1000 * r['listWonBoard'], 1000 * r['arrayWonBoard']))
+
+
+def drawBoardByRects(board, transparency=255):
+    # The drawBoard() inkspill.py used to have: a new window-sized surface
+    # and a pygame.draw.rect() call for every box, every time.
+    tempSurf = pygame.Surface(inkspill.DISPLAYSURF.get_size())
+    tempSurf = tempSurf.convert_alpha()
+    tempSurf.fill((0, 0, 0, 0))
+    for x in range(inkspill.boardWidth):
+        for y in range(inkspill.boardHeight):
+            left, top = inkspill.leftTopPixelCoordOfBox(x, y)
+            r, g, b = inkspill.paletteColors[board[x][y]]
+            pygame.draw.rect(tempSurf, (r, g, b, transparency), (left, top, inkspill.boxSize, inkspill.boxSize))
+    left, top = inkspill.leftTopPixelCoordOfBox(0, 0)
+    pygame.draw.rect(tempSurf, inkspill.BLACK, (left-1, top-1, inkspill.boxSize * inkspill.boardWidth + 1,
+                                                inkspill.boxSize * inkspill.boardHeight + 1), 1)
+    inkspill.DISPLAYSURF.blit(tempSurf, (0, 0))
+
+
+def measureRendering(frames):
+    # Draws frames of floodAnimation() (the old board, then the new one on
+    # top with some transparency) for every size in RENDERSIZES, both ways,
+    # and returns a list of (size, box size, old ms/frame, new ms/frame).
+    pygame.init()
+    inkspill.DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+    results = []
+    for size, boxSize in RENDERSIZES:
+        inkspill.boardWidth = inkspill.boardHeight = size
+        inkspill.boxSize = boxSize
+        oldBoard = inkspill.generateRandomBoard(size, size, HARD)
+        newBoard = oldBoard.copy()
+        inkspill.floodFill(newBoard, newBoard[0, 0], (newBoard[0, 0] + 1) % NUMCOLORS, 0, 0)
+        times = []
+        for drawBoard in (drawBoardByRects, inkspill.drawBoard):
+            drawBoard(oldBoard) # anything made on the first call isn't counted
+            startTime = time.perf_counter()
+            for frame in range(frames):
+                drawBoard(oldBoard)
+                drawBoard(newBoard, frame * 255 // frames)
+            times.append(1000 * (time.perf_counter() - startTime) / frames)
+        results.append((size, boxSize, times[0], times[1]))
+    return results
+
+
+def printRenderResults(results):
+    print('    board  box  boxes drawn   by rects ms/frame   surfarray ms/frame   speedup')
+    for size, boxSize, oldMs, newMs in results:
+        print('%9s %4s %12s %19.2f %20.2f %8.0fx' % ('%sx%s' % (size, size), boxSize,
+                                                     2 * size * size, oldMs, newMs, oldMs / newMs))
+
+
+def drawBoardBySurfarray(board, transparency=255):
+    # The drawBoard() inkspill.py had before boardSurf was kept up to date
+    # between calls: every box is rendered again on every call.
+    width, height = board.shape
+    palette = numpy.array([oldBoardSurf.map_rgb(color) for color in inkspill.paletteColors], dtype=numpy.uint32)
+    pixels = palette[board]
+    if inkspill.boxSize > 1:
+        pixels = pixels.repeat(inkspill.boxSize, axis=0).repeat(inkspill.boxSize, axis=1)
+    pygame.surfarray.blit_array(oldBoardSurf, pixels)
+    oldBoardSurf.set_alpha(transparency if transparency < 255 else None)
+    left, top = inkspill.leftTopPixelCoordOfBox(0, 0)
+    inkspill.DISPLAYSURF.blit(oldBoardSurf, (left, top))
+    pygame.draw.rect(inkspill.DISPLAYSURF, inkspill.BLACK, (left-1, top-1, inkspill.boxSize * width + 1,
+                                                            inkspill.boxSize * height + 1), 1)
+
+
+def redrawnFloodAnimation(tracker, paletteClicked, animationSpeed=25):
+    # The floodAnimation() inkspill.py used to have: both boards drawn in
+    # full on every step.
+    board = tracker['board']
+    origBoard = board.copy()
+    inkspill.floodTracked(tracker, paletteClicked)
+    for transparency in range(0, 255, animationSpeed):
+        drawBoardBySurfarray(origBoard)
+        drawBoardBySurfarray(board, transparency)
+        pygame.display.update()
+
+
+def redrawnFlashBorderAnimation(color, board, animationSpeed=30):
+    # The flashBorderAnimation() inkspill.py used to have: a new
+    # window-sized flash surface, and the board drawn again on every step.
+    origSurf = inkspill.DISPLAYSURF.copy()
+    flashSurf = pygame.Surface(inkspill.DISPLAYSURF.get_size())
+    flashSurf = flashSurf.convert_alpha()
+    for start, end, step in ((0, 256, 1), (255, 0, -1)):
+        for transparency in range(start, end, animationSpeed * step):
+            inkspill.DISPLAYSURF.blit(origSurf, (0, 0))
+            r, g, b = color
+            flashSurf.fill((r, g, b, transparency))
+            inkspill.DISPLAYSURF.blit(flashSurf, (0, 0))
+            drawBoardBySurfarray(board)
+            pygame.display.update()
+    inkspill.DISPLAYSURF.blit(origSurf, (0, 0))
+
+
+def measureAnimation(floods):
+    # Plays floods flood animations (with the color that grows the flooded
+    # area most) and one flash on every size in RENDERSIZES, the old way and
+    # the cached way, without waiting for the frame rate. Returns a list of
+    # (size, box size, old flood ms/step, new flood ms/step, old flash
+    # ms/step, new flash ms/step).
+    global oldBoardSurf
+    pygame.init()
+    inkspill.DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+    inkspill.FPSCLOCK = pygame.time.Clock()
+    inkspill.FPS = 0 # tick() doesn't wait
+    floodSteps = len(range(0, 255, 25))
+    flashSteps = len(range(0, 256, 30)) + len(range(255, 0, -30))
+    results = []
+    for size, boxSize in RENDERSIZES:
+        inkspill.boardWidth = inkspill.boardHeight = size
+        inkspill.boxSize = boxSize
+        oldBoardSurf = pygame.Surface((size * boxSize, size * boxSize)).convert()
+        startBoard = inkspill.generateRandomBoard(size, size, HARD, seed=size)
+        times = []
+        for flood, flash in ((redrawnFloodAnimation, redrawnFlashBorderAnimation),
+                             (inkspill.floodAnimation, inkspill.flashBorderAnimation)):
+            tracker = inkspill.getFloodTracker(startBoard.copy())
+            inkspill.DISPLAYSURF.fill(inkspill.bgColor)
+            inkspill.drawBoard(tracker['board'])
+            seconds = 0.0
+            for i in range(floods):
+                color = getGreedyColor(tracker['board'])
+                startTime = time.perf_counter()
+                flood(tracker, color)
+                seconds += time.perf_counter() - startTime
+            times.append(1000 * seconds / (floods * floodSteps))
+            flash(inkspill.WHITE, tracker['board']) # anything made on the first call isn't counted
+            startTime = time.perf_counter()
+            flash(inkspill.WHITE, tracker['board'])
+            times.append(1000 * (time.perf_counter() - startTime) / flashSteps)
+        results.append((size, boxSize, times[0], times[2], times[1], times[3]))
+    return results
+
+
+def printAnimationResults(results):
+    print('all times in ms per animation step')
+    print('    board  box  flood: redrawn   cached  flash: redrawn   cached')
+    for size, boxSize, oldFlood, newFlood, oldFlash, newFlash in results:
+        print('%9s %4s %15.2f %8.2f %15.2f %8.2f' % ('%sx%s' % (size, size), boxSize,
+                                                    oldFlood, newFlood, oldFlash, newFlash))
+
+
+def measureHugeBoardAlone(size, moves, zoom, seed):
+    # Runs measureHugeBoard() in a new process, so the memory it measures
+    # is only that size's.
+    with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+        return pool.submit(measureHugeBoard, size, moves, zoom, seed).result()
+
+
+def getResidentBytes():
+    # Returns the memory the process has resident now (on Linux), or the
+    # most it has had (elsewhere).
+    try:
+        with open('/proc/self/statm') as fileObj:
+            return int(fileObj.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def getWidestFrontierColor(tracker):
+    # Returns the color with the most boxes next to the flooded area, which
+    # is quick to find on any size of board.
+    return max(range(NUMCOLORS), key=lambda color: len(tracker['frontier'][color]))
+
+
+def measureHugeBoard(size, moves, zoom, seed):
+    # Sets up a size x size game as inkspill.py does for a huge board, and
+    # plays moves moves on it. A move is what the game does for a palette
+    # click, less the animation's waiting: the flood, throwing away the
+    # chunks it reached, and rendering the viewport again. The viewport is
+    # moved to follow the edge of the flooded area, so it always has
+    # flooded chunks to render again. The same moves are played on a
+    # tracker that recolors the board, as the normal sizes do, to compare.
+    # Returns a dict of the seconds and bytes taken.
+    pygame.init()
+    inkspill.DISPLAYSURF = pygame.display.set_mode((WINDOWWIDTH, WINDOWHEIGHT))
+    inkspill.boardWidth = inkspill.boardHeight = size
+    inkspill.difficulty = HARD
+    startBytes = getResidentBytes()
+    results = {'size': size}
+
+    startTime = time.perf_counter()
+    board = inkspill.generateRandomBoard(size, size, HARD, seed=seed)
+    results['generate'] = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    solutionLength = inkspill.getSolutionLength(board)
+    results['life'] = time.perf_counter() - startTime
+    recolorTracker = inkspill.getFloodTracker(board.copy())
+    startTime = time.perf_counter()
+    tracker = inkspill.getGameTracker(board)
+    viewport = inkspill.viewport
+    viewport['zoom'] = ZOOMLEVELS.index(zoom)
+    inkspill.renderViewport(tracker)
+    results['setup'] = time.perf_counter() - startTime
+
+    times = []
+    recolorTimes = []
+    rendered = viewport['rendered']
+    for i in range(moves):
+        color = getWidestFrontierColor(tracker)
+        startTime = time.perf_counter()
+        inkspill.floodTracked(tracker, color)
+        inkspill.markFloodedChunks(viewport, tracker)
+        inkspill.renderViewport(tracker)
+        times.append(time.perf_counter() - startTime)
+        startTime = time.perf_counter()
+        inkspill.floodTracked(recolorTracker, color)
+        recolorTimes.append(time.perf_counter() - startTime)
+        edge = max(tracker['gained'] or [0])
+        inkspill.panViewport(viewport, (edge // size) * zoom - viewport['left'] - inkspill.VIEWPORTSIZE // 2,
+                             (edge % size) * zoom - viewport['top'] - inkspill.VIEWPORTSIZE // 2, board.shape)
+    results['moveTimes'] = times
+    results['recolorTimes'] = recolorTimes
+    results['chunksPerMove'] = (viewport['rendered'] - rendered) / moves
+    results['flooded'] = tracker['count']
+    results['solutionLength'] = solutionLength
+    del recolorTracker
+    results['bytes'] = getResidentBytes() - startBytes
+    return results
+
+
+def printHugeResults(results):
+    budget = 1000 / FPS
+    print('move times in ms: the viewport game\'s (flood, chunks, rendering) and, for comparison, '
+          'a flood that recolors the board')
+    print('memory is the resident memory the game added, in MB; frame budget %.1f ms' % budget)
+    print('     size   life  setup s  flooded  move: mean    max  over budget  chunks/move'
+          '  recolor: mean    max   memory')
+    for r in results:
+        times = [1000 * seconds for seconds in r['moveTimes']]
+        recolorTimes = [1000 * seconds for seconds in r['recolorTimes']]
+        print('%9s %6s %8.2f %8s %11.2f %6.2f %12s %12.1f %14.2f %6.2f %8.1f' % (
+            '%sx%s' % (r['size'], r['size']), r['solutionLength'],
+            r['generate'] + r['life'] + r['setup'], r['flooded'], sum(times) / len(times), max(times),
+            sum(1 for ms in times if ms > budget), r['chunksPerMove'],
+            sum(recolorTimes) / len(recolorTimes), max(recolorTimes), r['bytes'] / 2 ** 20))
+
+
+def formatMs(seconds):
+    if seconds is None:
+        return 'RecursionError'
+    return '%.2f' % (1000 * seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Ink Spill board generator
+# Generates boards in bulk, solves every one to measure how hard it is, and
+# saves them to a board pack that the game deals new boards from.
+#
+#   python inkspillgen.py --size 17 --difficulty medium --count 100000
+#   python inkspillgen.py --size 6 --difficulty easy --count 2000000 --strategy greedy
+#
+# The pack is written to the file the game looks for (BOARDPACKFILE in
+# inkspill.py) unless --output says otherwise. The same --seed, size,
+# difficulty and --batch always make the same pack, whatever --workers is.
+
+import argparse, collections, os, time, concurrent.futures
+import numpy
+import inkspill
+from inkspill import (GREEDY, BEAM, ASTAR, DIFFICULTYNAMES, BOARDPACKFILE, BOARDPACKMAGIC,
+                      BOARDPACKHEADER, SOLVERSTRATEGY)
+
+DIFFICULTIES = {name: value for value, name in DIFFICULTYNAMES.items()}
+BATCHSIZE = 10000 # boards generated at once by one worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a pack of solved Ink Spill boards.')
+    parser.add_argument('--size', type=int, default=inkspill.MEDIUMBOARDSIZE,
+                        help='board width and height (default: %s)' % inkspill.MEDIUMBOARDSIZE)
+    parser.add_argument('--difficulty', choices=list(DIFFICULTIES), default='medium',
+                        help='how much the boards are made easier (default: medium)')
+    parser.add_argument('--count', type=int, default=100000, help='boards to make (default: 100000)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the boards (default: 0)')
+    parser.add_argument('--strategy', choices=(GREEDY, BEAM, ASTAR), default=SOLVERSTRATEGY,
+                        help='solver that measures the boards (default: %s, as the game uses)' % SOLVERSTRATEGY)
+    parser.add_argument('--batch', type=int, default=BATCHSIZE,
+                        help='boards generated at once (default: %s)' % BATCHSIZE)
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='worker processes (default: all cores)')
+    parser.add_argument('--output', help='pack file to write (default: the one the game reads)')
+    args = parser.parse_args()
+
+    difficulty = DIFFICULTIES[args.difficulty]
+    filename = args.output or BOARDPACKFILE % (args.size, args.size, args.difficulty)
+    startTime = time.perf_counter()
+    counts = writeBoardPack(filename, args.size, args.size, difficulty, args.count, args.seed,
+                            args.strategy, args.batch, args.workers)
+    printResults(filename, args.count, counts, time.perf_counter() - startTime)
+
+
+def writeBoardPack(filename, width, height, difficulty, count, seed, strategy, batchSize, workers):
+    # Generates and solves count boards in batches spread over a pool of
+    # processes, and writes them to filename as they come back (in order).
+    # Returns a Counter of how many boards needed each number of moves.
+    counts = collections.Counter()
+    batches = [(start, min(batchSize, count - start)) for start in range(0, count, batchSize)]
+    with open(filename, 'wb') as fileObj, \
+         concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        fileObj.write(BOARDPACKHEADER.pack(BOARDPACKMAGIC, width, height, len(inkspill.paletteColors),
+                                           difficulty, count, seed))
+        for records, lengths in pool.map(makeBatch, [width] * len(batches), [height] * len(batches),
+                                         [difficulty] * len(batches), [seed] * len(batches),
+                                         [start // batchSize for start, size in batches],
+                                         [size for start, size in batches], [strategy] * len(batches)):
+            fileObj.write(records)
+            counts.update(lengths.tolist())
+    return counts
+
+
+def makeBatch(width, height, difficulty, seed, batchNumber, size, strategy):
+    # Runs in a worker process. Every batch has its own random stream, made
+    # from the seed and the batch's number. Returns the batch's records and
+    # the solution length of each board.
+    rng = numpy.random.default_rng((seed, batchNumber))
+    boards = inkspill.generateRandomBoards(size, width, height, difficulty, rng)
+    lengths = numpy.array([len(inkspill.solveBoard(board, strategy)['moves']) for board in boards])
+    return inkspill.packBoards(boards, lengths), lengths
+
+
+def printResults(filename, count, counts, seconds):
+    # Prints how fast the pack was made and how many moves its boards need,
+    # which is what the game's life for them is based on.
+    lengths = numpy.repeat(list(counts), list(counts.values()))
+    print('%s boards in %.1f s (%.0f boards/sec), %s bytes in %s' % (
+        count, seconds, count / seconds, os.path.getsize(filename), filename))
+    print('moves to solve: min %s, mean %.1f, median %.0f, 90th percentile %.0f, max %s' % (
+        lengths.min(), lengths.mean(), numpy.median(lengths), numpy.percentile(lengths, 90),
+        lengths.max()))
+    for moves in sorted(counts):
+        print('%6s moves %10s boards %6.2f%%' % (moves, counts[moves], 100 * counts[moves] / count))
+
+
+if __name__ == '__main__':
+    main()